@@ -0,0 +1,47 @@
+"""Micro-benchmarks of disabled SimpleLogger calls.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_simple_logger [-n CALLS] [--repeat N]
+
+Measures the cost of a call at a disabled level, with the message built eagerly, with
+deferred % args and with a lazy message callable, against `logging.Logger.debug`.
+Nothing is written, the default logger is set to INFO.
+"""
+import argparse
+import logging
+import statistics
+import timeit
+from typing import Callable, Dict
+
+from simple_logger import SimpleLogger
+
+
+def _cases(logger: logging.Logger) -> Dict[str, Callable[[], None]]:
+    value = {"user": 42, "items": list(range(10))}
+    return {
+        "logging.Logger.debug(f-string)": lambda: logger.debug(f"state {value}"),
+        "logging.Logger.debug(%-args)": lambda: logger.debug("state %s", value),
+        "SimpleLogger.debug(f-string)": lambda: SimpleLogger.debug(f"state {value}"),
+        "SimpleLogger.debug(%-args)": lambda: SimpleLogger.debug("state %s", value),
+        "SimpleLogger.debug(callable)": lambda: SimpleLogger.debug(lambda: f"state {value}"),
+        "empty call": lambda: None,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark disabled SimpleLogger calls.")
+    parser.add_argument("-n", "--calls", type=int, default=1000000, help="Number of calls per run.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per case, the median is reported.")
+    args = parser.parse_args()
+
+    simple_logger = SimpleLogger("bench_simple_logger", log_level=logging.INFO)
+    simple_logger.as_default()
+    for name, case in _cases(simple_logger.logger).items():
+        runs = timeit.repeat(case, number=args.calls, repeat=args.repeat)
+        print(f"{name:<34}{statistics.median(runs) / args.calls * 1e9:>10,.1f} ns/call")
+    simple_logger.clear_handlers()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""Load test of TelnetServer with many concurrent local sessions.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_telnetd [-n SESSIONS] [--keystrokes N] [--bulk-bytes N] [--compress]
+                                       [--port PORT --stats-port PORT]
+
+Without --port a server is started in a subprocess on free local ports. Every session connects,
+waits for its shell, types --keystrokes single characters one at a time waiting for each echo,
+then prints --bulk-bytes of text. All sessions run at the same time. Reports connect latency
+(from the client's connect until the shell answers its first command, so it includes the wait in
+the server's listen backlog), keystroke echo round-trip percentiles, aggregate bulk throughput and
+the server's own counters read from its stats port. The server's accept-to-shell latency starts at
+accept and leaves the backlog out; the gap between the two shows queueing before accept.
+"""
+import argparse
+import asyncio
+import json
+import socket
+import subprocess
+import sys
+import time
+import zlib
+from typing import List, Optional
+
+IAC, DO, DONT, WILL, SB, SE = 255, 253, 254, 251, 250, 240
+OPT_COMPRESS2 = 86
+_COMPRESS_START = bytes((IAC, SB, OPT_COMPRESS2, IAC, SE))
+
+
+class _Client:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, compress: bool):
+        self.reader = reader
+        self.writer = writer
+        self.compress = compress
+        self.decompressor: Optional[zlib.Decompress] = None
+        self.answered = False
+        self.buffer = bytearray()
+        self.wire_bytes = 0
+        self.text_bytes = 0
+
+    async def _read(self) -> None:
+        data = await self.reader.read(65536)
+        if not data:
+            raise EOFError("server closed the session")
+        self.wire_bytes += len(data)
+        if self.decompressor is not None:
+            data = self.decompressor.decompress(data)
+        self.text_bytes += len(data)
+        self.buffer += data
+        if not self.answered and bytes((IAC, WILL, OPT_COMPRESS2)) in self.buffer:
+            # The other options need no answer, the server starts in character mode either way
+            self.answered = True
+            self.writer.write(bytes((IAC, DO if self.compress else DONT, OPT_COMPRESS2)))
+        if self.decompressor is None and _COMPRESS_START in self.buffer:
+            head, rest = self.buffer.split(_COMPRESS_START, 1)
+            self.decompressor = zlib.decompressobj()
+            self.buffer = head + self.decompressor.decompress(rest)
+
+    async def expect(self, marker: bytes) -> None:
+        while marker not in self.buffer:
+            # Keep enough of the tail for a marker split across reads
+            del self.buffer[:-len(marker) - 1024]
+            await self._read()
+        del self.buffer[:self.buffer.index(marker) + len(marker)]
+
+    def send(self, data: bytes) -> None:
+        self.writer.write(data)
+
+
+async def _session(host: str, port: int, args: argparse.Namespace, results: dict) -> None:
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection(host, port)
+    client = _Client(reader, writer, args.compress)
+    # The quotes keep the echoed command line from matching the marker
+    client.send(b'PS1=; echo RE""ADY\r\n')
+    await client.expect(b"READY\r\n")
+    results["connect"].append(time.perf_counter() - start)
+
+    for _ in range(args.keystrokes):
+        sent = time.perf_counter()
+        client.send(b"x")
+        await client.expect(b"x")
+        results["echo"].append(time.perf_counter() - sent)
+    # Ctrl-U discards the typed line
+    client.send(b"\x15")
+
+    wire, text = client.wire_bytes, client.text_bytes
+    sent = time.perf_counter()
+    client.send(b"yes 'bulk output from the telnet load test' | head -c %d; echo; echo DO\"\"NE\r\n" % args.bulk_bytes)
+    await client.expect(b"DONE\r\n")
+    results["bulk_spans"].append((sent, time.perf_counter()))
+    results["bulk_wire"] += client.wire_bytes - wire
+    results["bulk_text"] += client.text_bytes - text
+
+    client.send(b"exit\r\n")
+    try:
+        while True:
+            await client._read()
+    except (EOFError, ConnectionError):
+        pass
+    writer.close()
+
+
+async def _run(host: str, port: int, args: argparse.Namespace) -> dict:
+    results = {"connect": [], "echo": [], "bulk_spans": [], "bulk_wire": 0, "bulk_text": 0}
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(*(_session(host, port, args, results) for _ in range(args.sessions)),
+                                    return_exceptions=True)
+    results["wall"] = time.perf_counter() - start
+    results["errors"] = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+    return results
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(port: int, stats_port: int, args: argparse.Namespace) -> subprocess.Popen:
+    code = ("import logging, telnetd; logging.disable(logging.INFO); "
+            f"telnetd.TelnetServer('127.0.0.1', {port}, max_sessions={args.sessions + 16}, "
+            f"shell_pool_size={args.shell_pool_size}, stats_port={stats_port}).start()")
+    server = subprocess.Popen([sys.executable, "-c", code])
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", stats_port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.05)
+    server.kill()
+    raise RuntimeError("telnet server did not start")
+
+
+def _read_stats(host: str, stats_port: int) -> dict:
+    with socket.create_connection((host, stats_port), timeout=5) as sock:
+        data = b""
+        while not data.endswith(b"\n"):
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+    return json.loads(data)
+
+
+def _percentiles(name: str, samples: List[float]) -> None:
+    if not samples:
+        print(f"{name:<22}no samples")
+        return
+    samples = sorted(samples)
+
+    def pick(q: float) -> float:
+        return samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+
+    print(f"{name:<22}p50 {pick(0.5):>8.2f} ms  p90 {pick(0.9):>8.2f} ms  p99 {pick(0.99):>8.2f} ms  "
+          f"max {samples[-1] * 1000:>8.2f} ms  ({len(samples)} samples)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test TelnetServer with concurrent sessions.")
+    parser.add_argument("-n", "--sessions", type=int, default=50, help="Concurrent sessions.")
+    parser.add_argument("--keystrokes", type=int, default=20, help="Echoed keystrokes per session.")
+    parser.add_argument("--bulk-bytes", type=int, default=1 << 20, help="Bulk output bytes per session.")
+    parser.add_argument("--compress", action="store_true", help="Accept MCCP2 compression.")
+    parser.add_argument("--shell-pool-size", type=int, default=4, help="Warm shells of the started server.")
+    parser.add_argument("--host", default="127.0.0.1", help="Host of an already running server.")
+    parser.add_argument("--port", type=int, help="Port of an already running server, default starts one.")
+    parser.add_argument("--stats-port", type=int, help="Stats port of an already running server.")
+    args = parser.parse_args()
+
+    server = None
+    port, stats_port = args.port, args.stats_port
+    if port is None:
+        port, stats_port = _free_port(), _free_port()
+        server = _start_server(port, stats_port, args)
+        # Let the shell pool fill up before the burst
+        time.sleep(1)
+    try:
+        results = asyncio.run(_run(args.host, port, args))
+        stats = _read_stats(args.host, stats_port) if stats_port is not None else None
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print(f"{args.sessions} sessions in {results['wall']:.2f}s, {len(results['errors'])} failed")
+    for error in results["errors"][:3]:
+        print(f"  {type(error).__name__}: {error}")
+    _percentiles("connect latency", results["connect"])
+    _percentiles("keystroke echo RTT", results["echo"])
+    if results["bulk_spans"]:
+        # From the first bulk command sent to the last one finished
+        bulk_wall = max(end for _, end in results["bulk_spans"]) - min(start for start, _ in results["bulk_spans"])
+        print(f"{'bulk throughput':<22}{results['bulk_text'] / bulk_wall / 1e6:>8.1f} MB/s of output, "
+              f"{results['bulk_wire'] / bulk_wall / 1e6:.1f} MB/s on the wire "
+              f"({results['bulk_wire'] / max(results['bulk_text'], 1):.1%} of output size)")
+    if stats is not None:
+        print(f"{'server':<22}{stats['total_sessions']} sessions, {stats['rejected_sessions']} rejected, "
+              f"in {stats['bytes_in']:,} B, out {stats['bytes_out']:,} B, "
+              f"accept-to-shell avg {stats['queue_time_avg'] * 1000:.2f} ms, "
+              f"max {stats['queue_time_max'] * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Micro-benchmarks of simple_thread_pool against concurrent.futures.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_thread_pool [-n TASKS] [-w WORKERS] [--repeat N]
+
+Measures submit throughput, end-to-end latency percentiles of single tasks submitted to an
+idle pool, and the memory cost of a queued task. Results are printed as a table, keep the
+machine otherwise idle to compare runs.
+"""
+import argparse
+import gc
+import statistics
+import threading
+import time
+import tracemalloc
+import concurrent.futures
+from typing import Any, Callable, Dict, List
+
+from simple_thread_pool import simple_thread_pool
+
+
+def _noop() -> None:
+    pass
+
+
+def _executors(workers: int) -> Dict[str, Callable[[], Any]]:
+    return {
+        "simple_thread_pool": lambda: simple_thread_pool.ThreadPoolExecutor(max_workers=workers),
+        "simple_thread_pool(work_stealing)": lambda: simple_thread_pool.ThreadPoolExecutor(
+            max_workers=workers, work_stealing=True),
+        "concurrent.futures": lambda: concurrent.futures.ThreadPoolExecutor(max_workers=workers),
+    }
+
+
+def _drain(executor: Any, futures: List[Any]) -> None:
+    if isinstance(executor, simple_thread_pool.ThreadPoolExecutor):
+        executor.wait_completion()
+    else:
+        concurrent.futures.wait(futures)
+
+
+def bench_submit_throughput(factory: Callable[[], Any], tasks: int) -> Dict[str, float]:
+    """Submit `tasks` no-op tasks one by one, then wait for all of them."""
+    executor = factory()
+    start = time.perf_counter()
+    futures = [executor.submit(_noop) for _ in range(tasks)]
+    submitted = time.perf_counter()
+    _drain(executor, futures)
+    finished = time.perf_counter()
+    executor.shutdown(wait=True)
+    return {
+        "submit/s": tasks / (submitted - start),
+        "tasks/s": tasks / (finished - start),
+    }
+
+
+def bench_batch_throughput(factory: Callable[[], Any], tasks: int) -> Dict[str, float]:
+    """Submit `tasks` no-op tasks in one batch where the executor supports it."""
+    executor = factory()
+    start = time.perf_counter()
+    if hasattr(executor, "submit_many"):
+        futures = executor.submit_many(lambda _: None, range(tasks))
+    else:
+        futures = [executor.submit(_noop) for _ in range(tasks)]
+    _drain(executor, futures)
+    finished = time.perf_counter()
+    executor.shutdown(wait=True)
+    return {"batch tasks/s": tasks / (finished - start)}
+
+
+def bench_latency(factory: Callable[[], Any], samples: int) -> Dict[str, float]:
+    """Submit a single task to an idle pool and wait for its result, `samples` times."""
+    executor = factory()
+    # Warm up, so thread creation is not measured
+    executor.submit(_noop).result()
+    latencies = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        executor.submit(_noop).result()
+        latencies.append(time.perf_counter() - start)
+    executor.shutdown(wait=True)
+    latencies.sort()
+    return {
+        "p50 us": latencies[len(latencies) // 2] * 1e6,
+        "p99 us": latencies[int(len(latencies) * 0.99)] * 1e6,
+        "max us": latencies[-1] * 1e6,
+    }
+
+
+def bench_queued_task_memory(factory: Callable[[], Any], tasks: int) -> Dict[str, float]:
+    """Measure the memory allocated per task queued behind a blocked pool."""
+    executor = factory()
+    release = threading.Event()
+    if isinstance(executor, simple_thread_pool.ThreadPoolExecutor):
+        workers = executor.max_workers
+    else:
+        workers = executor._max_workers
+    # Keep every worker busy, so the measured tasks stay queued
+    blockers = [executor.submit(release.wait) for _ in range(workers)]
+    time.sleep(0.1)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    futures = [executor.submit(_noop) for _ in range(tasks)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    release.set()
+    _drain(executor, futures + blockers)
+    executor.shutdown(wait=True)
+    return {"bytes/task": (after - before) / tasks}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark simple_thread_pool against concurrent.futures.")
+    parser.add_argument("-n", "--tasks", type=int, default=100000, help="Number of tasks per throughput run.")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="Number of worker threads.")
+    parser.add_argument("--samples", type=int, default=2000, help="Number of latency samples.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark, the median is reported.")
+    args = parser.parse_args()
+
+    benchmarks = [
+        (bench_submit_throughput, args.tasks),
+        (bench_batch_throughput, args.tasks),
+        (bench_latency, args.samples),
+        (bench_queued_task_memory, args.tasks),
+    ]
+    for name, factory in _executors(args.workers).items():
+        results: Dict[str, float] = {}
+        for bench, size in benchmarks:
+            runs = [bench(factory, size) for _ in range(args.repeat)]
+            for key in runs[0]:
+                results[key] = statistics.median(run[key] for run in runs)
+        print(name)
+        for key, value in results.items():
+            print(f"    {key:<16}{value:>14,.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,5 @@
 from .nio_pipe import NioPipe
-from .nio_subprocess import NioSubprocess
+from .nio_subprocess import OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_SPILL, NioSubprocess
+from .nio_subprocess_pool import SubprocessPool, SubprocessPoolError, serve
+from .nio_reactor import EVENT_READ, EVENT_WRITE, NioReactor, drain_fd, set_nonblocking
+from .nio_asyncio import NioStreamWriter, open_fd_reader
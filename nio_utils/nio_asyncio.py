@@ -0,0 +1,241 @@
+import os
+import asyncio
+import errno
+from typing import Any, Callable, Optional
+
+from .nio_reactor import fileno_of, set_nonblocking
+
+# Default limit of the StreamReader buffer, reading pauses above twice this size
+DEFAULT_LIMIT = 64 * 1024
+
+
+class _FdReadTransport(asyncio.ReadTransport):
+    def __init__(self,
+                 fd: int,
+                 reader: asyncio.StreamReader,
+                 loop: asyncio.AbstractEventLoop,
+                 on_close: Optional[Callable[[], Any]] = None):
+        """Feed a StreamReader from a non-blocking fd through `loop.add_reader`.
+
+        The StreamReader pauses the transport when its buffer exceeds twice its limit, which
+        removes the fd from the loop until the consumer catches up.
+        """
+        super().__init__()
+        self._fd = fd
+        self._reader = reader
+        self._loop = loop
+        self._on_close = on_close
+        self._paused = False
+        self._closing = False
+        reader.set_transport(self)
+        loop.add_reader(fd, self._read_ready)
+
+    def _read_ready(self) -> None:
+        while True:
+            try:
+                data = os.read(self._fd, DEFAULT_LIMIT)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return
+                self._reader.set_exception(e)
+                self.close()
+                return
+            if not data:
+                self._reader.feed_eof()
+                self.close()
+                return
+            self._reader.feed_data(data)
+            if self._paused or len(data) < DEFAULT_LIMIT:
+                return
+
+    def is_reading(self) -> bool:
+        return not self._paused and not self._closing
+
+    def pause_reading(self) -> None:
+        if self._closing or self._paused:
+            return
+        self._paused = True
+        self._loop.remove_reader(self._fd)
+
+    def resume_reading(self) -> None:
+        if self._closing or not self._paused:
+            return
+        self._paused = False
+        self._loop.add_reader(self._fd, self._read_ready)
+
+    def is_closing(self) -> bool:
+        return self._closing
+
+    def close(self) -> None:
+        if self._closing:
+            return
+        self._closing = True
+        self._loop.remove_reader(self._fd)
+        if self._on_close is not None:
+            self._on_close()
+
+    def get_extra_info(self, name: str, default: Any = None) -> Any:
+        return self._fd if name == "fd" else default
+
+
+class NioStreamWriter:
+    def __init__(self,
+                 endpoint: Any,
+                 loop: Optional[asyncio.AbstractEventLoop] = None,
+                 high_water: int = DEFAULT_LIMIT,
+                 low_water: Optional[int] = None,
+                 on_close: Optional[Callable[[], Any]] = None):
+        """StreamWriter-style writer for a non-blocking fd, flushed through `loop.add_writer`.
+
+        `write` never blocks: what the fd cannot take is buffered and written when the fd
+        becomes writable. `drain` applies backpressure by waiting until the buffer falls
+        below `low_water` once it has grown above `high_water`.
+
+        Args:
+            endpoint: A file descriptor, or an object with a fileno() method.
+            loop (asyncio.AbstractEventLoop, optional): The event loop. Defaults to the running loop.
+            high_water (int, optional): Buffer size above which `drain` waits. Defaults to 64 KiB.
+            low_water (int, optional): Buffer size below which `drain` resumes. Defaults to high_water / 4.
+            on_close (Callable, optional): Called once the buffer is flushed after `close`, e.g. to close the fd.
+                Defaults to None.
+        """
+        self._fd = fileno_of(endpoint)
+        self._loop = loop or asyncio.get_running_loop()
+        self._high_water = high_water
+        self._low_water = high_water // 4 if low_water is None else low_water
+        self._on_close = on_close
+        self._buffer = bytearray()
+        self._writing = False
+        self._closing = False
+        self._closed = self._loop.create_future()
+        self._drain_waiter: Optional[asyncio.Future] = None
+        self._exception: Optional[BaseException] = None
+        set_nonblocking(self._fd)
+
+    def get_extra_info(self, name: str, default: Any = None) -> Any:
+        return self._fd if name == "fd" else default
+
+    def get_write_buffer_size(self) -> int:
+        """Number of bytes accepted by write() that are not written yet."""
+        return len(self._buffer)
+
+    def write(self, data: bytes) -> None:
+        """Write data without blocking, buffering what the fd cannot take right now."""
+        if self._exception is not None:
+            raise self._exception
+        if self._closing:
+            raise RuntimeError("Cannot write after close")
+        if not data:
+            return
+        if not self._buffer:
+            try:
+                written = os.write(self._fd, data)
+            except OSError as e:
+                if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    self._fail(e)
+                    raise
+                written = 0
+            if written == len(data):
+                return
+            data = memoryview(data)[written:]
+        self._buffer += data
+        if not self._writing:
+            self._writing = True
+            self._loop.add_writer(self._fd, self._write_ready)
+
+    def writelines(self, lines: Any) -> None:
+        for line in lines:
+            self.write(line)
+
+    def _write_ready(self) -> None:
+        try:
+            written = os.write(self._fd, self._buffer)
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return
+            self._fail(e)
+            return
+        del self._buffer[:written]
+        if len(self._buffer) <= self._low_water:
+            self._wake_drain_waiter()
+        if not self._buffer:
+            self._writing = False
+            self._loop.remove_writer(self._fd)
+            if self._closing:
+                self._finish_close()
+
+    def _wake_drain_waiter(self) -> None:
+        waiter, self._drain_waiter = self._drain_waiter, None
+        if waiter is not None and not waiter.done():
+            if self._exception is not None:
+                waiter.set_exception(self._exception)
+            else:
+                waiter.set_result(None)
+
+    def _fail(self, exception: BaseException) -> None:
+        self._exception = exception
+        self._buffer.clear()
+        if self._writing:
+            self._writing = False
+            self._loop.remove_writer(self._fd)
+        self._wake_drain_waiter()
+        self._closing = True
+        self._finish_close()
+
+    def _finish_close(self) -> None:
+        if self._closed.done():
+            return
+        if self._on_close is not None:
+            self._on_close()
+        self._closed.set_result(None)
+
+    async def drain(self) -> None:
+        """Wait until the write buffer is small enough to continue writing."""
+        if self._exception is not None:
+            raise self._exception
+        if len(self._buffer) <= self._high_water:
+            return
+        if self._drain_waiter is None:
+            self._drain_waiter = self._loop.create_future()
+        await asyncio.shield(self._drain_waiter)
+
+    def can_write_eof(self) -> bool:
+        return False
+
+    def is_closing(self) -> bool:
+        return self._closing
+
+    def close(self) -> None:
+        """Close the writer once the buffered data is written."""
+        if self._closing:
+            return
+        self._closing = True
+        if not self._buffer:
+            self._finish_close()
+
+    async def wait_closed(self) -> None:
+        """Wait until the buffered data is written and the writer is closed."""
+        await self._closed
+
+
+def open_fd_reader(endpoint: Any,
+                   loop: Optional[asyncio.AbstractEventLoop] = None,
+                   limit: int = DEFAULT_LIMIT,
+                   on_close: Optional[Callable[[], Any]] = None) -> asyncio.StreamReader:
+    """Create an asyncio.StreamReader fed from a fd through `loop.add_reader`.
+
+    Args:
+        endpoint: A file descriptor, or an object with a fileno() method.
+        loop (asyncio.AbstractEventLoop, optional): The event loop. Defaults to the running loop.
+        limit (int, optional): Buffer limit of the reader, reading pauses above twice the limit. Defaults to 64 KiB.
+        on_close (Callable, optional): Called when the reader reaches EOF or fails. Defaults to None.
+
+    Returns:
+        asyncio.StreamReader: The reader.
+    """
+    loop = loop or asyncio.get_running_loop()
+    fd = fileno_of(endpoint)
+    set_nonblocking(fd)
+    reader = asyncio.StreamReader(limit=limit, loop=loop)
+    _FdReadTransport(fd, reader, loop, on_close)
+    return reader
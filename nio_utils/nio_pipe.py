@@ -2,31 +2,41 @@ import os
 import fcntl
 import select
 import errno
-from typing import Optional
+import sys
+import time
+from typing import Any, Optional, Tuple, Union
+
+
+# Size of the chunks appended to the buffer by read_all
+_READ_CHUNK_SIZE = 64 * 1024
+_READ_CHUNK_ZEROS = bytes(_READ_CHUNK_SIZE)
 
 
 class NioPipe:
-    def __init__(self, pipe_name: str):
+    def __init__(self, pipe_name: str, pipe_size: Optional[int] = None):
         """Initialize NioPipe.
 
         Args:
             pipe_name (str): The name of the pipe.
+            pipe_size (int, optional): Capacity of the pipe in bytes, set with F_SETPIPE_SZ on Linux.
+                Defaults to None, which keeps the system default (usually 64 KiB).
         """
         self.pipe_name = pipe_name
+        self.pipe_size = pipe_size
         self.pipe_fd = None
+        # Data accepted by write() that the pipe could not take yet
+        self._write_buffer = bytearray()
 
     def __enter__(self):
         """Context manager entry point."""
         if not os.path.exists(self.pipe_name):
             os.mkfifo(self.pipe_name)
-        self.pipe_fd = os.open(self.pipe_name, os.O_RDWR)
-        flags = fcntl.fcntl(self.pipe_fd, fcntl.F_GETFL)
-        fcntl.fcntl(self.pipe_fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+        self.open()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         """Context manager exit point."""
-        os.close(self.pipe_fd)
+        self.close()
         os.remove(self.pipe_name)
 
     def open(self) -> None:
@@ -35,20 +45,115 @@ class NioPipe:
             self.pipe_fd = os.open(self.pipe_name, os.O_RDWR)
             flags = fcntl.fcntl(self.pipe_fd, fcntl.F_GETFL)
             fcntl.fcntl(self.pipe_fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+            if self.pipe_size is not None:
+                self.set_pipe_size(self.pipe_size)
 
     def close(self) -> None:
-        """Close the pipe."""
+        """Close the pipe, data still waiting in the write buffer is flushed if the pipe can take it."""
         if self.pipe_fd is not None:
+            if self._write_buffer:
+                self.flush(timeout=0)
             os.close(self.pipe_fd)
             self.pipe_fd = None
+            self._write_buffer.clear()
+
+    def open_async(self, loop: Optional[Any] = None, limit: int = 64 * 1024) -> Tuple[Any, Any]:
+        """Open the pipe for asyncio code, creating the FIFO if needed.
+
+        Both streams are driven by `loop.add_reader`/`add_writer` on the pipe's fd, so one
+        event loop can serve many pipes without polling. Close the writer before the pipe.
+
+        Args:
+            loop (asyncio.AbstractEventLoop, optional): The event loop. Defaults to the running loop.
+            limit (int, optional): Buffer limit of the reader and high-water mark of the writer. Defaults to 64 KiB.
+
+        Returns:
+            Tuple[asyncio.StreamReader, NioStreamWriter]: The reader and the writer of the pipe.
+        """
+        from .nio_asyncio import NioStreamWriter, open_fd_reader
 
-    def write(self, data: bytes) -> None:
-        """Write data to the pipe.
+        if not os.path.exists(self.pipe_name):
+            os.mkfifo(self.pipe_name)
+        self.open()
+        reader = open_fd_reader(self.pipe_fd, loop=loop, limit=limit)
+        writer = NioStreamWriter(self.pipe_fd, loop=loop, high_water=limit)
+        return reader, writer
+
+    def fileno(self) -> int:
+        """Get the file descriptor of the pipe, so it can be registered with NioReactor or selectors."""
+        return self.pipe_fd
+
+    def set_pipe_size(self, size: int) -> int:
+        """Set the capacity of the pipe.
+
+        Args:
+            size (int): The requested capacity in bytes, the kernel rounds it up to a power of two pages.
+
+        Returns:
+            int: The actual capacity, or -1 if the platform does not support F_SETPIPE_SZ.
+        """
+        self.pipe_size = size
+        # fcntl only exposes F_SETPIPE_SZ since Python 3.10, its value on Linux is 1031
+        set_pipe_size = getattr(fcntl, "F_SETPIPE_SZ", 1031 if sys.platform.startswith("linux") else None)
+        if set_pipe_size is None:
+            return -1
+        return fcntl.fcntl(self.pipe_fd, set_pipe_size, size)
+
+    @property
+    def pending_write_bytes(self) -> int:
+        """Number of bytes accepted by write() that are not in the pipe yet."""
+        return len(self._write_buffer)
+
+    def _write_some(self, data: Union[bytes, memoryview]) -> int:
+        """Write as much as the pipe takes without blocking and return the number of bytes written."""
+        try:
+            return os.write(self.pipe_fd, data)
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return 0
+            raise
+
+    def write(self, data: bytes) -> int:
+        """Write data to the pipe without blocking.
+
+        The part of the data the pipe cannot take right now is kept in a write buffer and
+        written by the next write() or flush(), so the order of the data is preserved.
 
         Args:
             data (bytes): The data to write to the pipe.
+
+        Returns:
+            int: The number of bytes of `data` that went into the pipe immediately.
+        """
+        if self._write_buffer and not self.flush(timeout=0):
+            self._write_buffer += data
+            return 0
+        written = self._write_some(data)
+        if written < len(data):
+            self._write_buffer += memoryview(data)[written:]
+        return written
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Write the buffered data once the pipe is writable.
+
+        Args:
+            timeout (float, optional): Timeout in seconds. Defaults to None, which waits until everything is written.
+
+        Returns:
+            bool: True if the write buffer is empty.
         """
-        os.write(self.pipe_fd, data)
+        end_time = None if timeout is None else time.monotonic() + timeout
+        while self._write_buffer:
+            if timeout != 0:
+                remaining = None if end_time is None else max(0.0, end_time - time.monotonic())
+                _, wlist, _ = select.select([], [self.pipe_fd], [], remaining)
+                if not wlist:
+                    return False
+            written = self._write_some(self._write_buffer)
+            if written == 0 and timeout == 0:
+                return False
+            del self._write_buffer[:written]
+        return True
 
     def read(self, timeout: Optional[float] = None) -> Optional[bytes]:
         """Read data from the pipe.
@@ -64,11 +169,70 @@ class NioPipe:
             data = os.read(self.pipe_fd, 4096)
             return data
 
+    def _readv(self, view: memoryview) -> int:
+        """Read directly into `view` without blocking and return the number of bytes read."""
+        try:
+            return os.readv(self.pipe_fd, [view])
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return 0
+            raise
+
+    def readinto(self, buffer: Union[bytearray, memoryview], timeout: Optional[float] = None) -> Optional[int]:
+        """Read all available data into a caller-supplied buffer, without allocating.
+
+        Waits up to `timeout` for the pipe to become readable, then reads until the pipe is
+        empty or the buffer is full.
+
+        Args:
+            buffer (Union[bytearray, memoryview]): The writable buffer to fill from its start.
+            timeout (float, optional): Timeout in seconds. Defaults to None.
+
+        Returns:
+            Optional[int]: The number of bytes read, or None if no data is available.
+        """
+        rlist, _, _ = select.select([self.pipe_fd], [], [], timeout)
+        if self.pipe_fd not in rlist:
+            return None
+        view = memoryview(buffer).cast("B")
+        total = 0
+        while total < len(view):
+            count = self._readv(view[total:])
+            if count == 0:
+                break
+            total += count
+        return total
+
+    def read_all(self, buffer: Optional[bytearray] = None, timeout: Optional[float] = None) -> Optional[bytearray]:
+        """Drain all available data from the pipe, appending it to a bytearray.
+
+        Args:
+            buffer (bytearray, optional): The bytearray to append to, reused across calls to avoid
+                allocations. Defaults to None, which creates a new bytearray.
+            timeout (float, optional): Timeout in seconds. Defaults to None.
+
+        Returns:
+            Optional[bytearray]: The buffer, or None if no data is available.
+        """
+        rlist, _, _ = select.select([self.pipe_fd], [], [], timeout)
+        if self.pipe_fd not in rlist:
+            return None
+        if buffer is None:
+            buffer = bytearray()
+        while True:
+            start = len(buffer)
+            buffer += _READ_CHUNK_ZEROS
+            with memoryview(buffer) as view:
+                count = self._readv(view[start:])
+            del buffer[start + count:]
+            if count < _READ_CHUNK_SIZE:
+                return buffer
+
 
 if __name__ == "__main__":
     # 使用上下文管理器来打开管道并进行读写操作
     pipe_name = 'my_pipe'
-    with NioPipe(pipe_name) as non_blocking_pipe:
+    with NioPipe(pipe_name, pipe_size=1024 * 1024) as non_blocking_pipe:
         # 写管道
         try:
             non_blocking_pipe.write(b"Hello, non-blocking pipe!")
@@ -91,4 +255,16 @@ if __name__ == "__main__":
             else:
                 print("Error while reading: " + str(e))
 
+        # 批量写入超过管道容量的数据，未写入的部分会缓存在写缓冲区中
+        written = non_blocking_pipe.write(b"x" * (4 * 1024 * 1024))
+        print(f"Written {written} bytes, {non_blocking_pipe.pending_write_bytes} bytes buffered")
+
+        # 将管道中的数据一次性读入复用的缓冲区
+        buffer = bytearray()
+        while True:
+            non_blocking_pipe.flush(timeout=0)
+            if non_blocking_pipe.read_all(buffer, timeout=0) is None and not non_blocking_pipe.pending_write_bytes:
+                break
+        print(f"Drained {len(buffer)} bytes")
+
     # 管道会在退出上下文时自动关闭和清理资源
@@ -0,0 +1,278 @@
+import os
+import fcntl
+import errno
+import select
+import selectors
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+EVENT_READ = selectors.EVENT_READ
+EVENT_WRITE = selectors.EVENT_WRITE
+
+# Size of the chunks appended to the buffer by drain_fd
+_DRAIN_CHUNK_SIZE = 64 * 1024
+_DRAIN_CHUNK_ZEROS = bytes(_DRAIN_CHUNK_SIZE)
+
+
+def fileno_of(endpoint: Any) -> int:
+    """Get the file descriptor of an endpoint: an int, or any object with a fileno() method."""
+    if isinstance(endpoint, int):
+        return endpoint
+    return endpoint.fileno()
+
+
+def set_nonblocking(endpoint: Any) -> None:
+    """Put an endpoint in non-blocking mode, required for draining it.
+
+    Args:
+        endpoint: A file descriptor, or an object with a fileno() method.
+    """
+    fd = fileno_of(endpoint)
+    flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+    fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+
+
+def drain_fd(endpoint: Any, buffer: bytearray) -> Tuple[int, bool]:
+    """Read everything available from a non-blocking endpoint, appending it to a bytearray.
+
+    In edge-triggered mode a readiness event is only reported once, so readers must drain
+    the endpoint until EAGAIN before waiting again.
+
+    Args:
+        endpoint: A non-blocking file descriptor, or an object with a fileno() method.
+        buffer (bytearray): The bytearray to append to.
+
+    Returns:
+        Tuple[int, bool]: The number of bytes read, and whether the endpoint reached end of file.
+            Data and end of file can come back from the same call, and in edge-triggered mode the
+            endpoint is not reported again after it.
+    """
+    fd = fileno_of(endpoint)
+    total = 0
+    while True:
+        start = len(buffer)
+        buffer += _DRAIN_CHUNK_ZEROS
+        try:
+            with memoryview(buffer) as view:
+                count = os.readv(fd, [view[start:]])
+        except OSError as e:
+            del buffer[start:]
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return total, False
+            raise
+        del buffer[start + count:]
+        if count == 0:
+            return total, True
+        total += count
+
+
+class NioReactor:
+    def __init__(self, edge_triggered: bool = True):
+        """Multiplex many endpoints (NioPipe, sockets, subprocess pipes, fds) with one system call per poll.
+
+        Uses epoll where available, so the cost of a poll grows with the number of ready
+        endpoints rather than the number of registered ones, and there is no FD_SETSIZE limit.
+        Other platforms fall back to the best `selectors` implementation, which is level-triggered.
+
+        Args:
+            edge_triggered (bool, optional): Register endpoints with EPOLLET, so an endpoint is reported
+                once per state change and callbacks must drain it, e.g. with `drain_fd`. Defaults to True.
+        """
+        self._endpoints: Dict[int, Tuple[Any, int, Optional[Callable[[Any, int], Any]]]] = {}
+        self._running = False
+        if hasattr(select, "epoll"):
+            self._epoll: Optional[select.epoll] = select.epoll()
+            self._selector: Optional[selectors.BaseSelector] = None
+            self.edge_triggered = edge_triggered
+        else:
+            self._epoll = None
+            self._selector = selectors.DefaultSelector()
+            self.edge_triggered = False
+
+    def __enter__(self):
+        """Context manager entry point."""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context manager exit point."""
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._endpoints)
+
+    def _epoll_mask(self, events: int) -> int:
+        mask = 0
+        if events & EVENT_READ:
+            mask |= select.EPOLLIN | select.EPOLLRDHUP
+        if events & EVENT_WRITE:
+            mask |= select.EPOLLOUT
+        if self.edge_triggered:
+            mask |= select.EPOLLET
+        return mask
+
+    def register(self,
+                 endpoint: Any,
+                 events: int = EVENT_READ,
+                 callback: Optional[Callable[[Any, int], Any]] = None) -> None:
+        """Watch an endpoint.
+
+        Args:
+            endpoint: A file descriptor, or an object with a fileno() method such as NioPipe, a socket
+                or the stdout of a subprocess. It should be non-blocking, see `set_nonblocking`.
+            events (int, optional): EVENT_READ, EVENT_WRITE or both. Defaults to EVENT_READ.
+            callback (Callable, optional): Called with (endpoint, ready_events) by `run_once`. Defaults to None.
+        """
+        fd = fileno_of(endpoint)
+        if fd in self._endpoints:
+            raise KeyError(f"{endpoint!r} (fd {fd}) is already registered")
+        if self._epoll is not None:
+            self._epoll.register(fd, self._epoll_mask(events))
+        else:
+            self._selector.register(fd, events)
+        self._endpoints[fd] = (endpoint, events, callback)
+
+    def modify(self,
+               endpoint: Any,
+               events: int,
+               callback: Optional[Callable[[Any, int], Any]] = None) -> None:
+        """Change the watched events and the callback of a registered endpoint.
+
+        Args:
+            endpoint: The registered endpoint.
+            events (int): EVENT_READ, EVENT_WRITE or both.
+            callback (Callable, optional): The new callback. Defaults to None, which keeps the current one.
+        """
+        fd = fileno_of(endpoint)
+        registered, _, current = self._endpoints[fd]
+        if self._epoll is not None:
+            self._epoll.modify(fd, self._epoll_mask(events))
+        else:
+            self._selector.modify(fd, events)
+        self._endpoints[fd] = (registered, events, callback or current)
+
+    def unregister(self, endpoint: Any) -> None:
+        """Stop watching an endpoint, this does not close it.
+
+        Args:
+            endpoint: The registered endpoint.
+        """
+        fd = fileno_of(endpoint)
+        del self._endpoints[fd]
+        if self._epoll is not None:
+            try:
+                self._epoll.unregister(fd)
+            except OSError:
+                # The fd was closed before being unregistered, epoll already forgot it
+                pass
+        else:
+            self._selector.unregister(fd)
+
+    def poll(self, timeout: Optional[float] = None) -> List[Tuple[Any, int]]:
+        """Wait for registered endpoints to become ready.
+
+        Args:
+            timeout (float, optional): Timeout in seconds. Defaults to None, which waits forever.
+
+        Returns:
+            List[Tuple[Any, int]]: The ready endpoints and their ready events.
+        """
+        ready = []
+        if self._epoll is not None:
+            try:
+                fd_events = self._epoll.poll(-1 if timeout is None else timeout, max(len(self._endpoints), 1))
+            except InterruptedError:
+                return ready
+            for fd, mask in fd_events:
+                entry = self._endpoints.get(fd)
+                if entry is None:
+                    continue
+                events = 0
+                # Hang-ups and errors are reported as readable, the next read returns EOF or raises
+                if mask & (select.EPOLLIN | select.EPOLLRDHUP | select.EPOLLHUP | select.EPOLLERR):
+                    events |= EVENT_READ
+                if mask & select.EPOLLOUT:
+                    events |= EVENT_WRITE
+                ready.append((entry[0], events))
+        else:
+            for key, events in self._selector.select(timeout):
+                entry = self._endpoints.get(key.fd)
+                if entry is not None:
+                    ready.append((entry[0], events))
+        return ready
+
+    def run_once(self, timeout: Optional[float] = None) -> int:
+        """Poll once and call the callbacks of the ready endpoints.
+
+        Args:
+            timeout (float, optional): Timeout in seconds. Defaults to None, which waits forever.
+
+        Returns:
+            int: The number of dispatched callbacks.
+        """
+        dispatched = 0
+        for endpoint, events in self.poll(timeout):
+            # A previous callback may have unregistered this endpoint
+            entry = self._endpoints.get(fileno_of(endpoint))
+            if entry is None or entry[0] is not endpoint or entry[2] is None:
+                continue
+            entry[2](endpoint, events)
+            dispatched += 1
+        return dispatched
+
+    def run_forever(self, timeout: Optional[float] = None) -> None:
+        """Dispatch callbacks until `stop` is called or no endpoint is registered anymore.
+
+        Args:
+            timeout (float, optional): Maximum seconds between two checks of `stop`. Defaults to None.
+        """
+        self._running = True
+        while self._running and self._endpoints:
+            self.run_once(timeout)
+
+    def stop(self) -> None:
+        """Make `run_forever` return after the current poll."""
+        self._running = False
+
+    def close(self) -> None:
+        """Release the epoll or selector object, registered endpoints are not closed."""
+        self._endpoints.clear()
+        if self._epoll is not None:
+            self._epoll.close()
+        else:
+            self._selector.close()
+
+
+if __name__ == "__main__":
+    import subprocess
+
+    from nio_pipe import NioPipe
+
+    # 用一个反应器同时监视多个命名管道和子进程的输出
+    reactor = NioReactor()
+    received: Dict[str, bytearray] = {}
+
+    def on_readable(endpoint: Union[NioPipe, Any], events: int) -> None:
+        name = endpoint.pipe_name if isinstance(endpoint, NioPipe) else "subprocess"
+        buffer = received.setdefault(name, bytearray())
+        _, eof = drain_fd(endpoint, buffer)
+        if eof:
+            # 子进程退出，停止监视
+            reactor.unregister(endpoint)
+
+    pipes = [NioPipe(f"reactor_pipe_{i}") for i in range(100)]
+    for pipe in pipes:
+        pipe.__enter__()
+        reactor.register(pipe, EVENT_READ, on_readable)
+        pipe.write(f"hello from {pipe.pipe_name}".encode())
+
+    proc = subprocess.Popen(["echo", "hello from subprocess"], stdout=subprocess.PIPE)
+    set_nonblocking(proc.stdout)
+    reactor.register(proc.stdout, EVENT_READ, on_readable)
+
+    while reactor.run_once(timeout=0.5):
+        pass
+    print(f"{len(received)} endpoints reported data, e.g. {received.get('subprocess')}")
+
+    proc.wait()
+    for pipe in pipes:
+        pipe.__exit__(None, None, None)
+    reactor.close()
@@ -1,58 +1,428 @@
+import os
+import time
+import errno
+import tempfile
 import subprocess
-from threading import Thread
-from queue import Queue, Empty
+from collections import deque
+from functools import partial
+from threading import Condition, Lock, Thread
+from typing import Any, Callable, Deque, List, Optional, Tuple
+
+from .nio_reactor import EVENT_READ, NioReactor, drain_fd, set_nonblocking
+
+# 缓冲区溢出策略：暂停读取使子进程阻塞在写管道上、丢弃最旧的数据、将数据溢出到临时文件
+OVERFLOW_BLOCK = "block"
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_SPILL = "spill"
+
+# 每次从溢出文件加载到内存的最大字节数
+_REFILL_SIZE = 64 * 1024
+
+
+class _OutputBuffer:
+    def __init__(self, max_bytes: int, overflow: str):
+        """子进程输出的有界缓冲区，按块存储读到的数据
+
+        Args:
+            max_bytes: 内存中缓存的最大字节数
+            overflow: 溢出策略，OVERFLOW_BLOCK、OVERFLOW_DROP_OLDEST或OVERFLOW_SPILL
+        """
+        if overflow not in (OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_SPILL):
+            raise ValueError(f"Unknown overflow policy: {overflow!r}")
+        if max_bytes <= 0:
+            raise ValueError("max_bytes must be greater than 0")
+        self.max_bytes = max_bytes
+        self.overflow = overflow
+        self.dropped_bytes = 0
+        self._lock = Lock()
+        self._readable = Condition(self._lock)
+        self._chunks: Deque[bytes] = deque()
+        # 第一个块中已读取的字节数，_size不包括这部分
+        self._head_pos = 0
+        self._size = 0
+        self._eof = False
+        # 溢出文件中尚未读取的数据总是比内存中的数据新
+        self._spill: Optional[Any] = None
+        self._spill_offset = 0
+        self._spill_size = 0
+        # 阻塞策略下暂停读取后，由IO线程设置的恢复读取回调
+        self._paused = False
+        self.on_resume: Optional[Callable[[], Any]] = None
+
+    def __len__(self) -> int:
+        return self._size + self._spill_size
+
+    def feed(self, data: bytes) -> bool:
+        """写入一块数据，返回False表示缓冲区已满，应暂停读取"""
+        with self._lock:
+            if self._spill_size or (self.overflow == OVERFLOW_SPILL and self._size + len(data) > self.max_bytes):
+                if self._spill is None:
+                    self._spill = tempfile.TemporaryFile()
+                self._spill.seek(0, os.SEEK_END)
+                self._spill.write(data)
+                self._spill_size += len(data)
+                self._readable.notify_all()
+                return True
+            self._chunks.append(data)
+            self._size += len(data)
+            self._readable.notify_all()
+            if self.overflow == OVERFLOW_DROP_OLDEST:
+                while self._size > self.max_bytes:
+                    excess = self._size - self.max_bytes
+                    available = len(self._chunks[0]) - self._head_pos
+                    if available <= excess:
+                        self._chunks.popleft()
+                        self._head_pos = 0
+                        excess = available
+                    else:
+                        self._head_pos += excess
+                    self._size -= excess
+                    self.dropped_bytes += excess
+            elif self.overflow == OVERFLOW_BLOCK and self._size >= self.max_bytes:
+                self._paused = True
+                return False
+            return True
+
+    def feed_eof(self) -> None:
+        with self._lock:
+            self._eof = True
+            self._readable.notify_all()
+
+    def _refill(self) -> bool:
+        """内存为空时从溢出文件加载最多_REFILL_SIZE字节，调用者需持有锁"""
+        if not self._spill_size:
+            return False
+        self._spill.seek(self._spill_offset)
+        data = self._spill.read(min(self._spill_size, self.max_bytes, _REFILL_SIZE))
+        self._spill_offset += len(data)
+        self._spill_size -= len(data)
+        if not self._spill_size:
+            self._spill.seek(0)
+            self._spill.truncate()
+            self._spill_offset = 0
+        self._chunks.append(data)
+        self._size += len(data)
+        return True
+
+    def _pop_head(self) -> bytes:
+        """取出第一个块中未读取的部分，调用者需持有锁"""
+        chunk = self._chunks.popleft()
+        if self._head_pos:
+            chunk = chunk[self._head_pos:]
+            self._head_pos = 0
+        self._size -= len(chunk)
+        return chunk
+
+    def _consume(self, n: int) -> bytes:
+        """取出n个字节，内存和溢出文件中至少要有n个字节，调用者需持有锁"""
+        pieces = []
+        while n > 0:
+            if not self._chunks:
+                self._refill()
+            if len(self._chunks[0]) - self._head_pos <= n:
+                pieces.append(self._pop_head())
+                n -= len(pieces[-1])
+            else:
+                pieces.append(self._chunks[0][self._head_pos:self._head_pos + n])
+                self._head_pos += n
+                self._size -= n
+                n = 0
+        return b"".join(pieces)
+
+    def _unread(self, data: bytes, from_spill: int = 0) -> None:
+        """放回读出但未用完的数据，调用者需持有锁
+
+        最后from_spill字节来自溢出文件，放回溢出文件以免超出内存上限；
+        只在内存和溢出文件都已读空时调用，此时溢出文件为空。
+        """
+        spilled = min(len(data), from_spill)
+        if spilled:
+            self._spill.seek(0)
+            self._spill.truncate()
+            self._spill.write(data[len(data) - spilled:])
+            self._spill_offset = 0
+            self._spill_size = spilled
+            data = data[:len(data) - spilled]
+        if data:
+            if self._head_pos:
+                self._chunks[0] = self._chunks[0][self._head_pos:]
+                self._head_pos = 0
+            self._chunks.appendleft(data)
+            self._size += len(data)
+
+    def _check_resume(self) -> None:
+        resume = None
+        with self._lock:
+            if self._paused and self._size < self.max_bytes:
+                self._paused = False
+                resume = self.on_resume
+        if resume is not None:
+            resume()
+
+    def read_all(self) -> Optional[bytes]:
+        with self._lock:
+            data = self._consume(len(self))
+        self._check_resume()
+        return data or None
+
+    def read_exact(self, n: int, timeout: Optional[float] = None) -> Optional[bytes]:
+        """等待并读取n个字节，超时返回None，数据不足n字节时流已结束则抛出EOFError
+
+        OVERFLOW_BLOCK策略下n不能超过max_bytes，否则读取暂停后永远等不到足够的数据。
+        """
+        end_time = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while len(self) < n:
+                if self._eof:
+                    raise EOFError(f"Stream closed after {len(self)} of {n} bytes")
+                remaining = None if end_time is None else end_time - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._readable.wait(remaining)
+            data = self._consume(n)
+        self._check_resume()
+        return data
+
+    def read_lines(self, max_n: Optional[int] = None) -> List[bytes]:
+        with self._lock:
+            spill_size = self._spill_size
+            lines = []
+            pieces = []
+            if max_n is None:
+                # 读取全部数据时逐块整体切分，只在块的边界上调用Python代码，溢出文件每次只加载_REFILL_SIZE字节
+                while self._chunks or self._refill():
+                    parts = self._pop_head().split(b"\n")
+                    if len(parts) > 1:
+                        pieces.append(parts[0])
+                        lines.append(b"".join(pieces) + b"\n")
+                        lines.extend(part + b"\n" for part in parts[1:-1])
+                        pieces = []
+                    if parts[-1]:
+                        pieces.append(parts[-1])
+            else:
+                # 从读取位置逐行查找，每行的开销与行长成正比，与块的大小无关
+                while len(lines) < max_n and (self._chunks or self._refill()):
+                    head = self._chunks[0]
+                    end = head.find(b"\n", self._head_pos)
+                    if end < 0:
+                        pieces.append(self._pop_head())
+                        continue
+                    end += 1
+                    pieces.append(head[self._head_pos:end])
+                    self._size -= end - self._head_pos
+                    if end == len(head):
+                        self._chunks.popleft()
+                        self._head_pos = 0
+                    else:
+                        self._head_pos = end
+                    lines.append(b"".join(pieces) if len(pieces) > 1 else pieces[0])
+                    pieces = []
+            tail = b"".join(pieces)
+            if tail:
+                if self._eof and not len(self):
+                    # 子进程已关闭输出，最后一行没有换行符
+                    lines.append(tail)
+                else:
+                    # 没有换行符的最后一行留到下次读取，其中来自溢出文件的部分仍放在溢出文件中
+                    self._unread(tail, spill_size - self._spill_size)
+        self._check_resume()
+        return lines
+
+
+class _SubprocessIOThread:
+    def __init__(self):
+        """所有NioSubprocess共用的IO线程，通过一个反应器读取任意数量子进程的stdout/stderr
+
+        反应器使用水平触发，管道关闭后的下一次轮询一定会报告EOF。
+        """
+        self._reactor = NioReactor(edge_triggered=False)
+        self._pending_lock = Lock()
+        self._pending: List[Callable[[], Any]] = []
+        # 其他线程通过唤醒管道把操作交给IO线程执行，反应器只在IO线程中修改
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        set_nonblocking(self._wakeup_r)
+        set_nonblocking(self._wakeup_w)
+        self._reactor.register(self._wakeup_r, EVENT_READ, self._on_wakeup)
+        self._thread = Thread(target=self._reactor.run_forever, name="NioSubprocessIO", daemon=True)
+        self._thread.start()
+
+    def call_soon(self, callback: Callable[[], Any]) -> None:
+        """在IO线程中执行callback"""
+        with self._pending_lock:
+            self._pending.append(callback)
+        try:
+            os.write(self._wakeup_w, b"\0")
+        except OSError as e:
+            # 唤醒管道已满，IO线程必然会被唤醒
+            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+
+    def add(self, stream: Any, buffer: _OutputBuffer) -> None:
+        """将子进程的输出流读入缓冲区，流到达EOF后自动关闭"""
+        set_nonblocking(stream)
+        buffer.on_resume = partial(self.call_soon, partial(self._register, stream, buffer))
+        self.call_soon(partial(self._register, stream, buffer))
+
+    def _register(self, stream: Any, buffer: _OutputBuffer) -> None:
+        if not stream.closed:
+            self._reactor.register(stream, EVENT_READ, partial(self._on_readable, buffer))
+
+    def _on_wakeup(self, endpoint: int, events: int) -> None:
+        drain_fd(endpoint, bytearray())
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+        for callback in pending:
+            callback()
+
+    def _on_readable(self, buffer: _OutputBuffer, stream: Any, events: int) -> None:
+        chunk = bytearray()
+        try:
+            _, eof = drain_fd(stream, chunk)
+        except OSError:
+            eof = True
+        keep_reading = buffer.feed(bytes(chunk)) if chunk else True
+        if eof:
+            buffer.feed_eof()
+            self._reactor.unregister(stream)
+            stream.close()
+        elif not keep_reading:
+            # 缓冲区已满，停止读取，子进程写满管道后会阻塞，直到读取数据后恢复
+            self._reactor.unregister(stream)
+
+
+_io_thread: Optional[_SubprocessIOThread] = None
+_io_thread_lock = Lock()
+
+
+def _get_io_thread() -> _SubprocessIOThread:
+    global _io_thread
+    with _io_thread_lock:
+        if _io_thread is None:
+            _io_thread = _SubprocessIOThread()
+        return _io_thread
 
 
 class NioSubprocess:
-    def __init__(self, sub_process: subprocess.Popen):
+    def __init__(self,
+                 sub_process: subprocess.Popen,
+                 async_mode: bool = False,
+                 max_buffer_bytes: int = 4 * 1024 * 1024,
+                 overflow: str = OVERFLOW_SPILL):
         """非阻塞读写子进程stdio
 
         Args:
             sub_process: 子进程实例
+            async_mode: 异步模式，不创建读线程，通过open_async获取asyncio读写流
+            max_buffer_bytes: stdout和stderr各自在内存中缓存的最大字节数，默认4MiB
+            overflow: 缓冲区满时的策略，默认OVERFLOW_SPILL
+                OVERFLOW_BLOCK: 暂停读取，子进程写满管道后阻塞
+                OVERFLOW_DROP_OLDEST: 丢弃最旧的数据
+                OVERFLOW_SPILL: 将超出的数据写入临时文件
         """
         self._subproc = sub_process
-        self._subproc_stdout_queue = Queue() if sub_process.stdout else None
-        self._subproc_stderr_queue = Queue() if sub_process.stderr else None
-        self._thread_detach_queue()
-
-    def _enqueue_stdout(self):
-        self._subproc.stdout.flush()
-        # read方法会阻塞到子进程退出，而readline只会阻塞到'\n'
-        for line in iter(self._subproc.stdout.readline, b''):
-            self._subproc_stdout_queue.put(line)
-        self._subproc.stdout.close()
-
-    def _enqueue_stderr(self):
-        self._subproc.stderr.flush()
-        # read方法会阻塞到子进程退出，而readline只会阻塞到'\n'
-        for line in iter(self._subproc.stderr.readline, b''):
-            self._subproc_stderr_queue.put(line)
-        self._subproc.stderr.close()
-
-    def _thread_detach_queue(self):
-        if self._subproc_stdout_queue:
-            thread = Thread(target=self._enqueue_stdout)
-            thread.setDaemon(True)
-            thread.start()
-        if self._subproc_stderr_queue:
-            thread = Thread(target=self._enqueue_stderr)
-            thread.setDaemon(True)
-            thread.start()
+        self._async_mode = async_mode
+        if async_mode:
+            self._subproc_stdout_buffer = None
+            self._subproc_stderr_buffer = None
+        else:
+            self._subproc_stdout_buffer = _OutputBuffer(max_buffer_bytes, overflow) if sub_process.stdout else None
+            self._subproc_stderr_buffer = _OutputBuffer(max_buffer_bytes, overflow) if sub_process.stderr else None
+            self._attach_io_thread()
+
+    def _attach_io_thread(self):
+        # 所有子进程共用一个IO线程，线程数不随子进程数增长
+        if self._subproc_stdout_buffer is not None:
+            _get_io_thread().add(self._subproc.stdout, self._subproc_stdout_buffer)
+        if self._subproc_stderr_buffer is not None:
+            _get_io_thread().add(self._subproc.stderr, self._subproc_stderr_buffer)
+
+    def open_async(self,
+                   loop: Optional[Any] = None,
+                   limit: int = 64 * 1024) -> Tuple[Optional[Any], Optional[Any], Optional[Any]]:
+        """获取子进程stdio的asyncio读写流，仅用于异步模式
+
+        读写流通过事件循环的add_reader/add_writer驱动，写流的drain提供背压，
+        关闭写流会在缓冲数据写完后关闭子进程的stdin。
+
+        Args:
+            loop: 事件循环，默认为当前运行的事件循环
+            limit: 读流的缓冲上限及写流的高水位，默认64KiB
+
+        Returns:
+            (stdin写流, stdout读流, stderr读流)，未重定向到管道的为None
+        """
+        if not self._async_mode:
+            raise RuntimeError("open_async requires async_mode=True")
+        from .nio_asyncio import NioStreamWriter, open_fd_reader
+
+        stdin = stdout = stderr = None
+        if self._subproc.stdin:
+            stdin = NioStreamWriter(self._subproc.stdin, loop=loop, high_water=limit,
+                                    on_close=self._subproc.stdin.close)
+        if self._subproc.stdout:
+            stdout = open_fd_reader(self._subproc.stdout, loop=loop, limit=limit,
+                                    on_close=self._subproc.stdout.close)
+        if self._subproc.stderr:
+            stderr = open_fd_reader(self._subproc.stderr, loop=loop, limit=limit,
+                                    on_close=self._subproc.stderr.close)
+        return stdin, stdout, stderr
+
+    def _check_sync_mode(self):
+        if self._async_mode:
+            raise RuntimeError("Use the streams returned by open_async in async_mode")
 
     def read_stdout(self):
-        try:
-            line = self._subproc_stdout_queue.get_nowait()
-        except Empty:
-            line = None
-        return line
+        """读取stdout的一行，没有完整的行时返回None"""
+        self._check_sync_mode()
+        lines = self._subproc_stdout_buffer.read_lines(1)
+        return lines[0] if lines else None
 
     def read_stderr(self):
-        try:
-            line = self._subproc_stderr_queue.get_nowait()
-        except Empty:
-            line = None
-        return line
+        """读取stderr的一行，没有完整的行时返回None"""
+        self._check_sync_mode()
+        lines = self._subproc_stderr_buffer.read_lines(1)
+        return lines[0] if lines else None
+
+    def read_stdout_all(self):
+        """一次读取stdout中所有可用的数据，没有数据时返回None"""
+        self._check_sync_mode()
+        return self._subproc_stdout_buffer.read_all()
+
+    def read_stderr_all(self):
+        """一次读取stderr中所有可用的数据，没有数据时返回None"""
+        self._check_sync_mode()
+        return self._subproc_stderr_buffer.read_all()
+
+    def read_stdout_lines(self, max_n=None):
+        """一次读取stdout中最多max_n个完整的行，max_n为None时读取所有行"""
+        self._check_sync_mode()
+        return self._subproc_stdout_buffer.read_lines(max_n)
+
+    def read_stderr_lines(self, max_n=None):
+        """一次读取stderr中最多max_n个完整的行，max_n为None时读取所有行"""
+        self._check_sync_mode()
+        return self._subproc_stderr_buffer.read_lines(max_n)
+
+    def read_stdout_exact(self, n, timeout=None):
+        """阻塞读取stdout的n个字节，用于定长协议
+
+        Args:
+            n: 读取的字节数
+            timeout: 超时时间（秒），默认为None，一直等待
+
+        Returns:
+            n个字节，超时返回None；stdout在读满n个字节前关闭时抛出EOFError
+        """
+        self._check_sync_mode()
+        return self._subproc_stdout_buffer.read_exact(n, timeout)
+
+    @property
+    def dropped_bytes(self):
+        """OVERFLOW_DROP_OLDEST策略下stdout和stderr丢弃的字节数"""
+        return sum(buffer.dropped_bytes for buffer in (self._subproc_stdout_buffer, self._subproc_stderr_buffer)
+                   if buffer is not None)
 
     def write(self, command):
+        self._check_sync_mode()
         self._subproc.stdin.write(command)
         self._subproc.stdin.flush()
@@ -0,0 +1,301 @@
+import sys
+import time
+import struct
+import subprocess
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from threading import Condition
+from typing import Any, BinaryIO, Callable, Deque, List, Optional, Sequence
+
+from .nio_subprocess import NioSubprocess
+
+# 请求帧：4字节大端负载长度 + 负载
+_REQUEST_HEADER = struct.Struct(">I")
+# 响应帧：4字节大端负载长度 + 1字节状态 + 负载，状态非0时负载为子进程中的异常信息
+_RESPONSE_HEADER = struct.Struct(">IB")
+_STATUS_OK = 0
+_STATUS_ERROR = 1
+
+
+class SubprocessPoolError(RuntimeError):
+    """子进程处理请求失败，或在处理请求时退出"""
+
+
+def _read_exact(stream: BinaryIO, n: int) -> Optional[bytes]:
+    data = b""
+    while len(data) < n:
+        chunk = stream.read(n - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def serve(handler: Callable[[bytes], bytes],
+          stdin: Optional[BinaryIO] = None,
+          stdout: Optional[BinaryIO] = None) -> None:
+    """在子进程中运行，循环读取请求帧，调用handler并写回响应帧，stdin关闭后返回
+
+    handler中的print会写到stderr，避免破坏stdout上的帧。
+
+    Args:
+        handler: 处理函数，参数和返回值都是bytes，抛出的异常会作为错误响应返回给调用者
+        stdin: 读取请求的流，默认为sys.stdin.buffer
+        stdout: 写入响应的流，默认为sys.stdout.buffer
+    """
+    stdin = stdin or sys.stdin.buffer
+    stdout = stdout or sys.stdout.buffer
+    sys.stdout = sys.stderr
+    while True:
+        header = _read_exact(stdin, _REQUEST_HEADER.size)
+        if header is None:
+            return
+        payload = _read_exact(stdin, _REQUEST_HEADER.unpack(header)[0])
+        if payload is None:
+            return
+        try:
+            response = handler(payload)
+            status = _STATUS_OK
+        except Exception as e:
+            response = f"{type(e).__name__}: {e}".encode()
+            status = _STATUS_ERROR
+        stdout.write(_RESPONSE_HEADER.pack(len(response), status))
+        stdout.write(response)
+        stdout.flush()
+
+
+class _PoolWorker:
+    def __init__(self, args: Sequence[str], popen_kwargs: dict):
+        self.process = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, **popen_kwargs)
+        self.nio = NioSubprocess(self.process)
+        self.requests = 0
+
+    def request(self, payload: bytes, timeout: Optional[float]) -> bytes:
+        self.requests += 1
+        # 整个请求共用一个截止时间，读取响应头和响应体的时间之和不超过timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self.nio.write(_REQUEST_HEADER.pack(len(payload)) + payload)
+        header = self.nio.read_stdout_exact(_RESPONSE_HEADER.size, timeout)
+        if header is None:
+            raise TimeoutError(f"No response from pid {self.process.pid} within {timeout}s")
+        length, status = _RESPONSE_HEADER.unpack(header)
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        response = self.nio.read_stdout_exact(length, remaining) if length else b""
+        if response is None:
+            raise TimeoutError(f"Incomplete response from pid {self.process.pid} within {timeout}s")
+        if status != _STATUS_OK:
+            raise SubprocessPoolError(response.decode(errors="replace"))
+        return response
+
+    def usable(self) -> bool:
+        """子进程仍在运行，且没有被stop或kill"""
+        return not self.process.stdin.closed and self.process.poll() is None
+
+    def stop(self) -> None:
+        """关闭stdin让子进程正常退出，不等待"""
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+
+    def kill(self) -> None:
+        self.stop()
+        self.process.kill()
+
+
+class SubprocessPool:
+    def __init__(self,
+                 args: Sequence[str],
+                 size: int = 4,
+                 max_requests: int = 0,
+                 timeout: Optional[float] = None,
+                 **popen_kwargs: Any):
+        """常驻子进程池，通过stdin/stdout上的长度前缀帧收发请求，子进程使用`serve`处理请求
+
+        每个请求只需一次管道往返，不再为每次调用付出fork/exec和解释器启动的开销。
+
+        Args:
+            args: 子进程的命令行
+            size: 子进程数量，默认为4
+            max_requests: 子进程处理这么多请求后被替换，用于回收泄漏的资源，默认为0，不替换
+            timeout: 默认的请求超时时间（秒），超时的子进程会被杀死并重启，默认为None
+            **popen_kwargs: 传给subprocess.Popen的其他参数，如cwd、env、stderr
+        """
+        if size <= 0:
+            raise ValueError("size must be greater than 0")
+        self.args = list(args)
+        self.size = size
+        self.max_requests = max_requests
+        self.timeout = timeout
+        self.restarts = 0
+        self._popen_kwargs = popen_kwargs
+        self._idle_changed = Condition()
+        self._closed = False
+        self._idle: Deque[_PoolWorker] = deque(_PoolWorker(self.args, popen_kwargs) for _ in range(size))
+        self._busy = 0
+        # 已停止但尚未回收的子进程
+        self._retired: List[_PoolWorker] = []
+
+    def __enter__(self):
+        """Context manager entry point."""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context manager exit point."""
+        self.close()
+
+    def _acquire(self) -> _PoolWorker:
+        with self._idle_changed:
+            while not self._idle:
+                if self._closed:
+                    raise RuntimeError("SubprocessPool is closed")
+                self._idle_changed.wait()
+            if self._closed:
+                raise RuntimeError("SubprocessPool is closed")
+            self._busy += 1
+            # 后进先出，常用的子进程缓存更热
+            worker = self._idle.pop()
+            if worker.usable():
+                return worker
+            if not worker.process.stdin.closed:
+                # 子进程在空闲时退出
+                self.restarts += 1
+        # 换一个新的子进程再处理请求，不让请求因为已经退出的子进程而失败
+        try:
+            return self._replace(worker)
+        except BaseException:
+            # stdin已关闭的子进程不会再计入restarts
+            worker.stop()
+            self._put_back(worker)
+            raise
+
+    def _release(self, worker: _PoolWorker, replace: bool) -> None:
+        if replace:
+            try:
+                worker = self._replace(worker)
+            except Exception:
+                # 留下不可用的子进程占住位置，下次_acquire时再重新启动，并把错误交给那个请求
+                pass
+        self._put_back(worker)
+
+    def _replace(self, worker: _PoolWorker) -> _PoolWorker:
+        # 先启动新的子进程，失败时旧的仍留在调用者手中
+        replacement = _PoolWorker(self.args, self._popen_kwargs)
+        worker.stop()
+        self._retire(worker)
+        return replacement
+
+    def _put_back(self, worker: _PoolWorker) -> None:
+        with self._idle_changed:
+            self._busy -= 1
+            if self._closed:
+                self._retired.append(worker)
+                worker.stop()
+            else:
+                self._idle.append(worker)
+            self._idle_changed.notify()
+
+    def _retire(self, worker: _PoolWorker) -> None:
+        with self._idle_changed:
+            self._retired = [retired for retired in self._retired if retired.process.poll() is None]
+            self._retired.append(worker)
+
+    def request(self, payload: bytes, timeout: Optional[float] = None) -> bytes:
+        """把请求发给一个空闲的子进程并等待响应，没有空闲子进程时等待
+
+        Args:
+            payload: 请求数据
+            timeout: 超时时间（秒），默认使用构造时的timeout
+
+        Returns:
+            子进程返回的响应数据
+
+        Raises:
+            SubprocessPoolError: 子进程中的handler抛出异常，或子进程在处理请求时退出
+            TimeoutError: 子进程没有在超时时间内响应
+        """
+        timeout = self.timeout if timeout is None else timeout
+        worker = self._acquire()
+        replace = False
+        try:
+            response = worker.request(payload, timeout)
+        except SubprocessPoolError:
+            # handler中的异常，子进程本身仍然可用
+            replace = 0 < self.max_requests <= worker.requests
+            raise
+        except (OSError, EOFError, TimeoutError) as e:
+            # 子进程崩溃或卡住，杀死并重启
+            replace = True
+            worker.kill()
+            with self._idle_changed:
+                self.restarts += 1
+            if isinstance(e, TimeoutError):
+                raise
+            raise SubprocessPoolError(f"Worker pid {worker.process.pid} exited with {worker.process.wait()}") from e
+        except BaseException:
+            # 请求被中断，帧的状态未知，不能再复用这个子进程
+            replace = True
+            worker.kill()
+            raise
+        else:
+            replace = 0 < self.max_requests <= worker.requests
+            if replace:
+                worker.stop()
+            return response
+        finally:
+            self._release(worker, replace)
+
+    def map(self,
+            payloads: Sequence[bytes],
+            timeout: Optional[float] = None,
+            executor: Optional[Executor] = None) -> List[bytes]:
+        """用所有子进程并发处理一批请求，按顺序返回响应
+
+        Args:
+            payloads: 请求数据
+            timeout: 每个请求的超时时间（秒），默认使用构造时的timeout
+            executor: 发送请求的线程池，如simple_thread_pool.ThreadPoolExecutor，
+                默认临时创建一个size个线程的concurrent.futures.ThreadPoolExecutor
+
+        Returns:
+            按请求顺序排列的响应数据
+        """
+        if executor is not None:
+            return list(executor.map(lambda payload: self.request(payload, timeout), payloads))
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            return list(executor.map(lambda payload: self.request(payload, timeout), payloads))
+
+    def close(self, timeout: float = 5.0) -> None:
+        """关闭所有子进程，等待它们退出，超时的子进程会被杀死
+
+        Args:
+            timeout: 每个子进程的退出等待时间（秒），默认为5
+        """
+        with self._idle_changed:
+            self._closed = True
+            workers = list(self._idle) + self._retired
+            self._idle.clear()
+            self._retired = []
+            self._idle_changed.notify_all()
+        for worker in workers:
+            worker.stop()
+        for worker in workers:
+            try:
+                worker.process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                worker.process.kill()
+                worker.process.wait()
+
+
+if __name__ == "__main__":
+    import time
+
+    # 在仓库根目录运行：python -m nio_utils.nio_subprocess_pool
+    server = [sys.executable, "-c", "from nio_utils.nio_subprocess_pool import serve; serve(bytes.upper)"]
+    with SubprocessPool(server, size=4, max_requests=1000) as pool:
+        print(pool.request(b"hello, subprocess pool"))
+
+        start = time.perf_counter()
+        responses = pool.map([f"request {i}".encode() for i in range(10000)])
+        elapsed = time.perf_counter() - start
+        print(f"{len(responses)} requests in {elapsed:.2f}s, {elapsed / len(responses) * 1e6:.0f} us per request")
@@ -1,9 +1,1065 @@
+import os
+import sys
+import glob
+import gzip
+import json
+import mmap
+import time
+import queue
+import bisect
+import random
+import socket
+import select
+import signal
+import struct
+import selectors
 import logging
+import threading
+import traceback
+from collections import deque
+from datetime import datetime
 from logging.handlers import RotatingFileHandler
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+# 异步模式下队列已满时的策略：阻塞调用者、丢弃新日志、丢弃最旧的日志
+OVERFLOW_BLOCK = "block"
+OVERFLOW_DROP_NEWEST = "drop_newest"
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+
+
+# 滚动后的日志分段按滚动时间命名，如 my_logger.log.20240101-000000-000000.gz
+_SEGMENT_TIME_FORMAT = "%Y%m%d-%H%M%S-%f"
+# 压缩分段时每个gzip成员包含的未压缩字节数，索引记录每个成员第一条日志的时间戳和偏移
+_COMPRESS_BLOCK_SIZE = 1024 * 1024
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        """
+        将日志格式化为一行JSON，包含时间戳ts、时间time、名称name、进程process、等级level、消息message，
+        有异常时包含exc_info
+
+        Args:
+            record: 日志记录
+
+        Returns:
+            一行JSON
+        """
+        data = {
+            "ts": record.created,
+            "time": self.formatTime(record),
+            "name": record.name,
+            "process": record.process,
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc_info"] = record.exc_text
+        if record.stack_info:
+            data["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+def _line_timestamp(line: bytes) -> Optional[float]:
+    try:
+        return float(json.loads(line)["ts"])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+class SegmentedRotatingFileHandler(RotatingFileHandler):
+    def __init__(self,
+                 filename: str,
+                 maxBytes: int = 0,
+                 backupCount: int = 0,
+                 rotate_interval: Optional[float] = None,
+                 compress: bool = True,
+                 encoding: Optional[str] = None,
+                 delay: bool = False):
+        """
+        按大小和时间滚动的日志文件处理器，滚动后的分段按滚动时间命名，由后台线程压缩为gzip，
+        写日志的线程不会等待压缩
+
+        压缩后的分段由多个gzip成员组成，旁边的.idx文件记录每个成员第一条日志的时间戳和偏移，
+        LogReader据此按时间定位。
+
+        Args:
+            filename: 日志文件路径
+            maxBytes: 日志文件的最大字节数，为0时不按大小滚动
+            backupCount: 保留的分段数量，为0时保留全部分段
+            rotate_interval: 按时间滚动的间隔，单位为秒，为None时不按时间滚动
+            compress: 是否压缩滚动后的分段
+            encoding: 日志文件的编码
+            delay: 是否延迟到第一条日志时才打开文件
+        """
+        super().__init__(filename, maxBytes=maxBytes, backupCount=backupCount, encoding=encoding, delay=delay)
+        self.rotate_interval = rotate_interval
+        self.compress = compress
+        self.rolloverAt = None if rotate_interval is None else time.time() + rotate_interval
+        self._segments: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._compressor = threading.Thread(target=self._compress_loop, name="SimpleLoggerCompressor", daemon=True)
+        self._compressor.start()
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self.rolloverAt is not None and record.created >= self.rolloverAt:
+            if self.stream is None:
+                self.stream = self._open()
+            if self._time_rollover(record.created, self.stream.tell()):
+                return True
+        return super().shouldRollover(record)
+
+    def _time_rollover(self, created: float, position: int) -> bool:
+        """判断是否到了按时间滚动的时间，空文件不滚动，只推迟下一次滚动时间"""
+        if self.rolloverAt is None or created < self.rolloverAt:
+            return False
+        if position:
+            return True
+        self.rolloverAt = created + self.rotate_interval
+        return False
+
+    def doRollover(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        now = time.time()
+        if os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename):
+            segment = f"{self.baseFilename}.{datetime.fromtimestamp(now).strftime(_SEGMENT_TIME_FORMAT)}"
+            os.rename(self.baseFilename, segment)
+            self._segments.put(segment)
+        if self.rotate_interval is not None:
+            self.rolloverAt = now + self.rotate_interval
+        if not self.delay:
+            self.stream = self._open()
+
+    def _compress_loop(self):
+        while True:
+            segment = self._segments.get()
+            if segment is None:
+                return
+            try:
+                if self.compress:
+                    self._compress_segment(segment)
+                self._remove_old_segments()
+            except OSError:
+                if logging.raiseExceptions:
+                    traceback.print_exc()
+
+    @staticmethod
+    def _compress_segment(segment: str):
+        index: List[Tuple[Optional[float], int]] = []
+        with open(segment, "rb") as src, open(segment + ".gz.tmp", "wb") as dst:
+            while True:
+                lines = src.readlines(_COMPRESS_BLOCK_SIZE)
+                if not lines:
+                    break
+                index.append((_line_timestamp(lines[0]), dst.tell()))
+                dst.write(gzip.compress(b"".join(lines)))
+        with open(segment + ".gz.idx", "w") as f:
+            json.dump(index, f)
+        os.replace(segment + ".gz.tmp", segment + ".gz")
+        os.remove(segment)
+
+    def _remove_old_segments(self):
+        if self.backupCount <= 0:
+            return
+        # 正在写入的日志文件可能不存在（delay=True或刚滚动），按文件名排除而不是去掉最后一个分段
+        segments = [segment for segment in LogReader(self.baseFilename).segments() if segment != self.baseFilename]
+        for segment in segments[:-self.backupCount]:
+            for path in (segment, segment + ".idx"):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def close(self):
+        """关闭日志文件，并等待正在压缩的分段完成"""
+        super().close()
+        if self._compressor.is_alive():
+            self._segments.put(None)
+            self._compressor.join()
+
+
+class LogReader:
+    def __init__(self, log_file: str):
+        """
+        按时间读取JsonFormatter写入的日志，包括SegmentedRotatingFileHandler滚动和压缩后的分段，
+        以及RotatingFileHandler滚动出的.1、.2等备份文件
+
+        Args:
+            log_file: 日志文件路径
+        """
+        self.log_file = log_file
+
+    def segments(self) -> List[str]:
+        """
+        按时间顺序列出所有分段，最后一个是正在写入的日志文件
+
+        Returns:
+            分段文件路径
+        """
+        segments = []
+        for path in glob.glob(glob.escape(self.log_file) + ".*"):
+            name = path[len(self.log_file) + 1:]
+            if name.endswith(".gz"):
+                name = name[:-3]
+            elif name.endswith((".idx", ".tmp")) or os.path.exists(path + ".gz"):
+                # 压缩尚未完成时，未压缩的分段仍是完整的
+                continue
+            if name.isdigit():
+                # RotatingFileHandler的备份文件，最后修改时间即滚动时间
+                segments.append((os.path.getmtime(path), path))
+                continue
+            try:
+                segments.append((datetime.strptime(name, _SEGMENT_TIME_FORMAT).timestamp(), path))
+            except ValueError:
+                continue
+        segments.sort()
+        result = [path for _, path in segments]
+        if os.path.exists(self.log_file):
+            result.append(self.log_file)
+        return result
+
+    @staticmethod
+    def _segment_end(path: str) -> float:
+        name = os.path.basename(path).rsplit(".", 2 if path.endswith(".gz") else 1)[1]
+        if name.isdigit():
+            return os.path.getmtime(path)
+        return datetime.strptime(name, _SEGMENT_TIME_FORMAT).timestamp()
+
+    @staticmethod
+    def _open_segment(path: str, start: Optional[float]):
+        if not path.endswith(".gz"):
+            return open(path, "rb")
+        offset = 0
+        if start is not None and os.path.exists(path + ".idx"):
+            with open(path + ".idx") as f:
+                index = [(ts, pos) for ts, pos in json.load(f) if ts is not None]
+            # 从第一条日志早于start的最后一个gzip成员开始解压
+            i = bisect.bisect_right([ts for ts, _ in index], start) - 1
+            if i > 0:
+                offset = index[i][1]
+        f = open(path, "rb")
+        f.seek(offset)
+        return gzip.GzipFile(fileobj=f, mode="rb")
+
+    def read(self, start: Optional[float] = None, end: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """
+        读取时间戳在[start, end]内的日志，跳过滚动时间早于start的分段，压缩分段通过索引直接定位到start附近，
+        读到第一条日志晚于end的分段时结束
+
+        Args:
+            start: 起始时间戳（time.time()），为None时从最早的日志开始
+            end: 结束时间戳，为None时读到最新的日志
+
+        Returns:
+            按写入顺序返回的日志字典，不是JSON的行会被跳过
+        """
+        for path in self.segments():
+            segment_end = None if path == self.log_file else self._segment_end(path)
+            if start is not None and segment_end is not None and segment_end < start:
+                continue
+            with self._open_segment(path, start) as stream:
+                first = True
+                for line in stream:
+                    try:
+                        record = json.loads(line)
+                        ts = float(record["ts"])
+                    except (ValueError, KeyError, TypeError):
+                        continue
+                    if first:
+                        first = False
+                        # 分段按写入顺序排列，第一条日志已经晚于end时之后的分段也都晚于end；
+                        # 异步模式下日志可能在创建之后的分段中才写入，因此不能用滚动时间判断
+                        if end is not None and ts > end:
+                            return
+                    if (start is None or ts >= start) and (end is None or ts <= end):
+                        yield record
+
+
+class _AsyncBatchHandler(logging.Handler):
+    def __init__(self,
+                 handlers: List[logging.Handler],
+                 queue_size: int = 10000,
+                 flush_interval: float = 0.5,
+                 batch_size: int = 512,
+                 overflow: str = OVERFLOW_BLOCK):
+        """
+        异步批量日志处理器，调用线程只把日志放入有界队列，由后台线程批量格式化并写入被包装的处理器
+
+        Args:
+            handlers: 被包装的日志处理器
+            queue_size: 队列中最多缓存的日志条数
+            flush_interval: 后台线程从收到第一条日志到写入的最长等待时间（秒）
+            batch_size: 每批写入的最大日志条数，攒够后立即写入，不超过queue_size
+            overflow: 队列已满时的策略，OVERFLOW_BLOCK、OVERFLOW_DROP_NEWEST或OVERFLOW_DROP_OLDEST
+        """
+        if overflow not in (OVERFLOW_BLOCK, OVERFLOW_DROP_NEWEST, OVERFLOW_DROP_OLDEST):
+            raise ValueError(f"Unknown overflow policy: {overflow!r}")
+        super().__init__()
+        self.handlers = handlers
+        self.queue_size = queue_size
+        self.flush_interval = flush_interval
+        # 批量大于队列时永远攒不够一批，每批都要等满flush_interval
+        self.batch_size = max(1, min(batch_size, queue_size))
+        self.overflow = overflow
+        self.dropped = 0
+        self._records: Deque[logging.LogRecord] = deque()
+        # 因队列已满而阻塞的调用线程数，非0时后台线程不再攒批
+        self._blocked = 0
+        self._changed = threading.Condition(threading.Lock())
+        self._writing = False
+        self._flush_requested = False
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_loop, name="SimpleLoggerWriter", daemon=True)
+        self._writer.start()
+
+    def emit(self, record: logging.LogRecord):
+        with self._changed:
+            if self._closed:
+                return
+            if len(self._records) >= self.queue_size:
+                if self.overflow == OVERFLOW_DROP_NEWEST:
+                    self.dropped += 1
+                    return
+                if self.overflow == OVERFLOW_DROP_OLDEST:
+                    self._records.popleft()
+                    self.dropped += 1
+                else:
+                    self._blocked += 1
+                    try:
+                        while len(self._records) >= self.queue_size and not self._closed:
+                            # 唤醒正在攒批的后台线程，立即写入已有的日志
+                            self._changed.notify_all()
+                            self._changed.wait()
+                    finally:
+                        self._blocked -= 1
+            self._records.append(record)
+            if len(self._records) == 1 or len(self._records) >= self.batch_size:
+                self._changed.notify_all()
+
+    def _next_batch(self) -> List[logging.LogRecord]:
+        with self._changed:
+            while not self._records and not self._closed:
+                self._changed.wait()
+            # 等待攒够一批，最多等待flush_interval
+            deadline = time.monotonic() + self.flush_interval
+            while (len(self._records) < self.batch_size and not self._blocked
+                   and not self._flush_requested and not self._closed):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+            batch = [self._records.popleft() for _ in range(min(len(self._records), self.batch_size))]
+            self._writing = bool(batch)
+            dropped, self.dropped = self.dropped, 0
+            self._changed.notify_all()
+        if dropped:
+            batch.append(logging.makeLogRecord({
+                "name": __name__, "levelno": logging.WARNING, "levelname": "WARNING",
+                "msg": "%d log records dropped, the async queue was full", "args": (dropped,),
+            }))
+        return batch
+
+    def _write_loop(self):
+        while True:
+            batch = self._next_batch()
+            if batch:
+                for handler in self.handlers:
+                    self._write_batch(handler, batch)
+            with self._changed:
+                self._writing = False
+                if not self._records:
+                    self._flush_requested = False
+                self._changed.notify_all()
+                if self._closed and not self._records:
+                    return
+
+    @staticmethod
+    def _write_batch(handler: logging.Handler, batch: List[logging.LogRecord]):
+        if not isinstance(handler, logging.StreamHandler):
+            for record in batch:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+            return
+        # 流处理器在一批日志写完后只flush一次；滚动文件处理器按shouldRollover的规则逐条检查是否需要滚动，
+        # 但只在每批开始时读取一次文件位置，避免每条日志都flush和重复格式化
+        rotating = isinstance(handler, RotatingFileHandler)
+        segmented = isinstance(handler, SegmentedRotatingFileHandler)
+        position = None
+        with handler.lock:
+            for record in batch:
+                if record.levelno < handler.level or not handler.filter(record):
+                    continue
+                try:
+                    msg = handler.format(record) + handler.terminator
+                    if handler.stream is None:
+                        handler.stream = handler._open()
+                    if rotating:
+                        if position is None:
+                            position = handler.stream.tell()
+                        if ((position and 0 < handler.maxBytes <= position + len(msg)) or
+                                (segmented and handler._time_rollover(record.created, position))):
+                            handler.doRollover()
+                            if handler.stream is None:
+                                handler.stream = handler._open()
+                            position = 0
+                        position += len(msg)
+                    handler.stream.write(msg)
+                except Exception:
+                    handler.handleError(record)
+            try:
+                handler.flush()
+            except Exception:
+                pass
+
+    def flush(self):
+        """等待队列中的日志全部写入"""
+        with self._changed:
+            if not self._writer.is_alive():
+                return
+            self._flush_requested = True
+            self._changed.notify_all()
+            while self._records or self._writing:
+                self._changed.wait()
+
+    def close(self):
+        """写完队列中的日志后停止后台线程，并关闭被包装的处理器"""
+        self.flush()
+        with self._changed:
+            self._closed = True
+            self._changed.notify_all()
+        self._writer.join()
+        for handler in self.handlers:
+            handler.close()
+        super().close()
+
+
+def _create_file_handler(log_file: str,
+                         file_max_bytes: int,
+                         file_backup_count: int,
+                         file_rotate_interval: Optional[float],
+                         compress_backups: bool) -> RotatingFileHandler:
+    if file_rotate_interval is not None or compress_backups:
+        return SegmentedRotatingFileHandler(log_file,
+                                            maxBytes=file_max_bytes,
+                                            backupCount=file_backup_count,
+                                            rotate_interval=file_rotate_interval,
+                                            compress=compress_backups)
+    return RotatingFileHandler(log_file, maxBytes=file_max_bytes, backupCount=file_backup_count)
+
+
+# 单条日志帧的最大字节数，超出时截断消息
+_MAX_FRAME_SIZE = 60 * 1024
+# 日志帧头：4字节大端长度
+_FRAME_HEADER = struct.Struct(">I")
+# 日志帧中保留的LogRecord属性，消息在发送前格式化
+_FRAME_FIELDS = ("name", "levelno", "levelname", "pathname", "filename", "module", "lineno", "funcName",
+                 "created", "msecs", "relativeCreated", "thread", "threadName", "process", "processName")
+
+
+_RECORD_NEW = logging.LogRecord.__new__
+_RECORD_DEFAULTS = {"args": None, "exc_info": None, "exc_text": None, "stack_info": None}
+
+
+class _UnixStreamHandler(logging.Handler):
+    def __init__(self, address: str, max_pending_bytes: int = 1024 * 1024, reconnect_interval: float = 1.0):
+        """
+        将日志编码为长度前缀的JSON帧，通过非阻塞的Unix流套接字发送给LogAggregator
+
+        套接字写满时帧暂存在有界的发送缓冲区中，随后续日志或flush发送；汇聚器未运行、监听队列已满或缓冲区已满时日志被丢弃，
+        调用者永远不会阻塞，丢弃的条数随下一条日志报告给汇聚器。fork出的子进程会建立自己的连接。
+
+        Args:
+            address: 汇聚器监听的Unix套接字路径
+            max_pending_bytes: 发送缓冲区的最大字节数
+            reconnect_interval: 连接失败后在这么多秒内不再尝试连接，期间的日志直接丢弃
+        """
+        super().__init__()
+        self.address = address
+        self.max_pending_bytes = max_pending_bytes
+        self.reconnect_interval = reconnect_interval
+        self.dropped = 0
+        self._socket: Optional[socket.socket] = None
+        self._pid = None
+        self._pending = bytearray()
+        self._retry_at = 0.0
+
+    def _connect(self) -> bool:
+        if self._pid != os.getpid():
+            if self._socket is not None:
+                # fork继承的连接和缓冲区属于父进程，子进程写入会打乱父进程的帧
+                self._socket.close()
+                self._socket = None
+                self._pending.clear()
+            self._pid = os.getpid()
+            self._retry_at = 0.0
+        if self._socket is not None:
+            return True
+        if time.monotonic() < self._retry_at:
+            return False
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # 非阻塞连接：汇聚器的监听队列已满时返回EAGAIN而不是阻塞调用者
+        self._socket.setblocking(False)
+        try:
+            self._socket.connect(self.address)
+        except OSError:
+            # 包括EAGAIN和EINPROGRESS，连接未立即建立时本条日志丢弃
+            self._socket.close()
+            self._socket = None
+            self._retry_at = time.monotonic() + self.reconnect_interval
+            return False
+        return True
+
+    def _encode(self, record: logging.LogRecord) -> bytes:
+        data = {field: getattr(record, field, None) for field in _FRAME_FIELDS}
+        data["msg"] = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        data["exc_text"] = record.exc_text
+        data["stack_info"] = record.stack_info
+        data["dropped"] = self.dropped
+        encoded = json.dumps(data, ensure_ascii=False).encode()
+        if len(encoded) > _MAX_FRAME_SIZE:
+            excess = len(encoded) - _MAX_FRAME_SIZE + 64
+            data["msg"] = data["msg"][:max(0, len(data["msg"]) - excess)] + " ...(truncated)"
+            data["exc_text"] = data["stack_info"] = None
+            encoded = json.dumps(data, ensure_ascii=False).encode()
+        return _FRAME_HEADER.pack(len(encoded)) + encoded
+
+    def _send_pending(self):
+        try:
+            sent = self._socket.send(self._pending)
+        except BlockingIOError:
+            return
+        except OSError:
+            # 汇聚器已关闭，下次重新连接
+            self.dropped += 1 if self._pending else 0
+            self._pending.clear()
+            self._socket.close()
+            self._socket = None
+            self._retry_at = time.monotonic() + self.reconnect_interval
+            return
+        del self._pending[:sent]
+
+    def emit(self, record: logging.LogRecord):
+        if not self._connect():
+            self.dropped += 1
+            return
+        if len(self._pending) >= self.max_pending_bytes:
+            self.dropped += 1
+            self._send_pending()
+            return
+        try:
+            frame = self._encode(record)
+        except Exception:
+            self.handleError(record)
+            return
+        self.dropped = 0
+        self._pending += frame
+        self._send_pending()
+
+    def flush(self, timeout: float = 1.0):
+        """
+        在timeout秒内尽量发送缓冲区中的日志
+        """
+        with self.lock:
+            deadline = time.monotonic() + timeout
+            while self._pending and self._socket is not None and self._pid == os.getpid():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not select.select([], [self._socket], [], remaining)[1]:
+                    break
+                self._send_pending()
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            if self._socket is not None:
+                self._socket.close()
+                self._socket = None
+        super().close()
+
+
+class LogAggregator:
+    def __init__(self,
+                 address: str,
+                 log_file: str,
+                 file_max_bytes: int = 9 * 1024 * 1024,
+                 file_backup_count: int = 5,
+                 formatter: str = "[%(asctime)s][%(name)s][%(process)d][%(levelname)s] %(message)s",
+                 json_format: bool = False,
+                 file_rotate_interval: float = None,
+                 compress_backups: bool = False,
+                 batch_size: int = 512):
+        """
+        多进程日志汇聚器，在Unix套接字上接收各进程SimpleLogger(aggregator_address=...)发送的日志，
+        由唯一的后台线程批量写入并滚动日志文件，避免多个进程同时写和滚动同一个文件
+
+        Args:
+            address: 监听的Unix套接字路径，已存在的文件会被删除
+            log_file: 日志文件路径
+            file_max_bytes: 日志文件的最大字节数（默认为 9MB）
+            file_backup_count: 保留的备份日志文件数量（默认为 5）
+            formatter: 日志格式化字符串
+            json_format: 日志文件使用JsonFormatter（默认为 False）
+            file_rotate_interval: 日志文件按时间滚动的间隔，单位为秒（默认为 None）
+            compress_backups: 在后台线程压缩滚动后的日志文件（默认为 False）
+            batch_size: 每批写入的最大日志条数（默认为 512）
+        """
+        self.address = address
+        self.batch_size = batch_size
+        self.received = 0
+        self.dropped = 0
+        self.file_handler = _create_file_handler(log_file, file_max_bytes, file_backup_count,
+                                                 file_rotate_interval, compress_backups)
+        self.file_handler.setFormatter(JsonFormatter() if json_format else logging.Formatter(formatter))
+        if os.path.exists(address):
+            os.remove(address)
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(address)
+        self._listener.listen(128)
+        self._listener.setblocking(False)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._listener, selectors.EVENT_READ)
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        """Context manager entry point."""
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context manager exit point."""
+        self.close()
+
+    def start(self):
+        """
+        启动接收和写入日志的后台线程
+        """
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._receive_loop, name="SimpleLoggerAggregator", daemon=True)
+            self._thread.start()
+
+    def _read_connection(self, connection: socket.socket, buffer: bytearray, batch: List[logging.LogRecord]):
+        try:
+            data = connection.recv(256 * 1024)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._selector.unregister(connection)
+            connection.close()
+            return
+        buffer += data
+        offset = 0
+        frames = []
+        while len(buffer) - offset >= _FRAME_HEADER.size:
+            size = _FRAME_HEADER.unpack_from(buffer, offset)[0]
+            end = offset + _FRAME_HEADER.size + size
+            if end > len(buffer):
+                break
+            frames.append(bytes(buffer[offset + _FRAME_HEADER.size:end]))
+            offset = end
+        if frames:
+            try:
+                # 一次解码所有完整的帧
+                records = json.loads(b"[" + b",".join(frames) + b"]")
+            except ValueError:
+                records = []
+                for frame in frames:
+                    try:
+                        records.append(json.loads(frame))
+                    except ValueError:
+                        continue
+            for fields in records:
+                if isinstance(fields, dict):
+                    # 字段已经完整，跳过LogRecord.__init__中对当前进程和线程的查询，它是汇聚器的主要开销
+                    record = _RECORD_NEW(logging.LogRecord)
+                    record.__dict__.update(_RECORD_DEFAULTS)
+                    record.__dict__.update(fields)
+                    batch.append(record)
+        del buffer[:offset]
+
+    def _poll(self, timeout: Optional[float]) -> List[logging.LogRecord]:
+        batch: List[logging.LogRecord] = []
+        for key, _ in self._selector.select(timeout):
+            if key.fileobj is self._listener:
+                try:
+                    connection, _ = self._listener.accept()
+                except BlockingIOError:
+                    continue
+                connection.setblocking(False)
+                self._selector.register(connection, selectors.EVENT_READ, bytearray())
+            else:
+                self._read_connection(key.fileobj, key.data, batch)
+        return batch
+
+    def _write(self, batch: List[logging.LogRecord]):
+        self.received += len(batch)
+        dropped = sum(record.__dict__.get("dropped") or 0 for record in batch)
+        if dropped:
+            self.dropped += dropped
+            batch.append(logging.makeLogRecord({
+                "name": __name__, "levelno": logging.WARNING, "levelname": "WARNING",
+                "msg": "%d log records dropped by producers, the aggregator was not keeping up", "args": (dropped,),
+            }))
+        for start in range(0, len(batch), self.batch_size):
+            _AsyncBatchHandler._write_batch(self.file_handler, batch[start:start + self.batch_size])
+
+    def _receive_loop(self):
+        while self._running:
+            batch = self._poll(0.5)
+            if batch:
+                self._write(batch)
+        # 写完已到达的日志
+        while True:
+            batch = self._poll(0)
+            if not batch:
+                break
+            self._write(batch)
+
+    def close(self):
+        """
+        停止后台线程，写完已收到的日志后关闭日志文件和套接字
+        """
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for key in list(self._selector.get_map().values()):
+            key.fileobj.close()
+        self._selector.close()
+        self.file_handler.close()
+        if os.path.exists(self.address):
+            os.remove(self.address)
+
+
+# 飞行记录器文件头：魔数、数据区容量、累计写入的字节数
+_RECORDER_HEADER = struct.Struct("<4sIQ")
+_RECORDER_MAGIC = b"SLFR"
+
+
+class FlightRecorder(logging.Handler):
+    def __init__(self,
+                 size: int = 1024 * 1024,
+                 path: str = None,
+                 dump_level: int = logging.ERROR,
+                 dump_handlers: List[logging.Handler] = None):
+        """
+        飞行记录器，将所有等级的日志格式化后写入固定大小的内存环形缓冲区，不写磁盘；
+        出现dump_level及以上的日志时，把上次转储之后记录的日志写入dump_handlers
+
+        指定path时缓冲区映射到文件，进程被强制杀死后仍可用FlightRecorder.load(path)读出最后的日志；
+        path已是飞行记录器文件时先重命名为path + ".prev"再重新初始化，重启后上次的日志仍可读出。
+
+        Args:
+            size: 缓冲区的字节数，包括16字节的文件头
+            path: 映射的文件路径，为None时使用匿名内存
+            dump_level: 触发转储的最低等级
+            dump_handlers: 转储的目标，通常是日志文件处理器
+        """
+        super().__init__()
+        if size <= _RECORDER_HEADER.size:
+            raise ValueError(f"size must be greater than {_RECORDER_HEADER.size}")
+        self.path = path
+        self.dump_level = dump_level
+        self.dump_handlers = dump_handlers or []
+        self.capacity = size - _RECORDER_HEADER.size
+        if path is None:
+            self._mmap = mmap.mmap(-1, size)
+        else:
+            self._keep_previous(path)
+            with open(path, "a+b") as f:
+                f.truncate(size)
+                self._mmap = mmap.mmap(f.fileno(), size)
+        self._written = 0
+        self._dumped = 0
+        self._mmap[:_RECORDER_HEADER.size] = _RECORDER_HEADER.pack(_RECORDER_MAGIC, self.capacity, 0)
+
+    @staticmethod
+    def _keep_previous(path: str):
+        """
+        把已有的飞行记录器文件重命名为path + ".prev"，覆盖更早的.prev，其它文件不动
+        """
+        try:
+            with open(path, "rb") as f:
+                header = f.read(_RECORDER_HEADER.size)
+        except FileNotFoundError:
+            return
+        if len(header) == _RECORDER_HEADER.size and header[:len(_RECORDER_MAGIC)] == _RECORDER_MAGIC:
+            os.replace(path, path + ".prev")
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            self._write((self.format(record) + "\n").encode(errors="replace"))
+        except Exception:
+            self.handleError(record)
+            return
+        if record.levelno >= self.dump_level:
+            self.dump(f"{record.levelname} record")
+
+    def _write(self, data: bytes):
+        if len(data) > self.capacity:
+            data = data[-self.capacity:]
+        position = self._written % self.capacity
+        first = min(len(data), self.capacity - position)
+        start = _RECORDER_HEADER.size + position
+        self._mmap[start:start + first] = data[:first]
+        if first < len(data):
+            self._mmap[_RECORDER_HEADER.size:_RECORDER_HEADER.size + len(data) - first] = data[first:]
+        self._written += len(data)
+        self._mmap[:_RECORDER_HEADER.size] = _RECORDER_HEADER.pack(_RECORDER_MAGIC, self.capacity, self._written)
+
+    @staticmethod
+    def _read(buffer: Any, capacity: int, written: int, since: int = 0) -> str:
+        start = max(since, written - capacity)
+        if start >= written:
+            return ""
+        begin = _RECORDER_HEADER.size + start % capacity
+        end = _RECORDER_HEADER.size + (written - 1) % capacity + 1
+        if begin < end:
+            data = bytes(buffer[begin:end])
+        else:
+            data = bytes(buffer[begin:_RECORDER_HEADER.size + capacity]) + bytes(buffer[_RECORDER_HEADER.size:end])
+        if start > since:
+            # 最旧的一行被覆盖了一部分
+            data = data[data.find(b"\n") + 1:]
+        return data.decode(errors="replace")
+
+    def read(self, since: int = 0) -> str:
+        """
+        读取缓冲区中的日志
+
+        Args:
+            since: 只读取累计写入字节数since之后的日志
+
+        Returns:
+            日志文本
+        """
+        with self.lock:
+            return self._read(self._mmap, self.capacity, self._written, since)
+
+    @staticmethod
+    def load(path: str) -> str:
+        """
+        读取飞行记录器文件中的日志，用于进程崩溃后查看现场
+
+        Args:
+            path: 飞行记录器文件路径
+
+        Returns:
+            日志文本
+        """
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, capacity, written = _RECORDER_HEADER.unpack_from(data)
+        if magic != _RECORDER_MAGIC:
+            raise ValueError(f"{path} is not a flight recorder file")
+        return FlightRecorder._read(data, capacity, written)
+
+    def dump(self, reason: str = "dump requested"):
+        """
+        将上次转储之后记录的日志写入dump_handlers
+
+        Args:
+            reason: 写在转储开头的原因
+        """
+        with self.lock:
+            if self._mmap.closed:
+                return
+            text = self._read(self._mmap, self.capacity, self._written, self._dumped)
+            self._dumped = self._written
+        if not text:
+            return
+        text = f"----- flight recorder: {reason} -----\n{text}----- end of flight recorder -----\n"
+        for handler in self.dump_handlers:
+            if not isinstance(handler, logging.StreamHandler):
+                continue
+            with handler.lock:
+                try:
+                    if handler.stream is None:
+                        handler.stream = handler._open()
+                    handler.stream.write(text)
+                    handler.flush()
+                except Exception:
+                    pass
+
+    def install_hooks(self, dump_signal: Optional[int] = None):
+        """
+        在未处理的异常（包括线程中的）和dump_signal信号时转储
+
+        Args:
+            dump_signal: 触发转储的信号，如signal.SIGUSR1，为None时不处理信号
+        """
+        previous_excepthook = sys.excepthook
+        previous_thread_excepthook = threading.excepthook
+
+        def excepthook(exc_type, exc_value, exc_traceback):
+            self.dump(f"unhandled {exc_type.__name__}")
+            previous_excepthook(exc_type, exc_value, exc_traceback)
+
+        def thread_excepthook(args):
+            self.dump(f"unhandled {args.exc_type.__name__} in thread {args.thread.name if args.thread else '?'}")
+            previous_thread_excepthook(args)
+
+        sys.excepthook = excepthook
+        threading.excepthook = thread_excepthook
+        if dump_signal is not None:
+            # 信号处理函数可能打断正持有处理器锁的代码，转储交给新线程执行
+            signal.signal(dump_signal, lambda signum, frame: threading.Thread(
+                target=self.dump, args=(f"signal {signum}",), daemon=True).start())
+
+    def close(self):
+        with self.lock:
+            if not self._mmap.closed:
+                self._mmap.flush()
+                self._mmap.close()
+        super().close()
+
+
+# 限流的键：按调用位置（文件和行号）或按消息模板
+RATE_LIMIT_BY_SITE = "site"
+RATE_LIMIT_BY_TEMPLATE = "template"
+# 限流状态的最大数量，按消息模板限流而消息是拼接好的字符串时，超出后清空状态
+_MAX_RATE_LIMIT_KEYS = 10000
+
+
+class _RateLimitFilter(logging.Filter):
+    def __init__(self,
+                 logger: logging.Logger,
+                 rate_limit: Optional[float] = None,
+                 rate_limit_burst: Optional[int] = None,
+                 rate_limit_key: str = RATE_LIMIT_BY_SITE,
+                 debug_sample_rate: float = 1.0,
+                 collapse_repeats: bool = False):
+        """
+        日志限流过滤器，每条日志只需一次字典查询
+
+        Args:
+            logger: 被过滤的日志记录器，用于输出重复消息的汇总
+            rate_limit: 每个键每秒最多输出的日志条数，为None时不限流
+            rate_limit_burst: 每个键允许的突发条数，默认为rate_limit
+            rate_limit_key: 限流的键，RATE_LIMIT_BY_SITE或RATE_LIMIT_BY_TEMPLATE
+            debug_sample_rate: DEBUG日志的采样概率
+            collapse_repeats: 是否将连续重复的日志合并为一条“上一条消息重复了N次”
+        """
+        if rate_limit_key not in (RATE_LIMIT_BY_SITE, RATE_LIMIT_BY_TEMPLATE):
+            raise ValueError(f"Unknown rate limit key: {rate_limit_key!r}")
+        super().__init__()
+        self.logger = logger
+        self.rate_limit = rate_limit
+        self.rate_limit_burst = max(1.0, rate_limit if rate_limit_burst is None else rate_limit_burst) \
+            if rate_limit is not None else None
+        self.by_site = rate_limit_key == RATE_LIMIT_BY_SITE
+        self.debug_sample_rate = debug_sample_rate
+        self.collapse_repeats = collapse_repeats
+        self._lock = threading.Lock()
+        # 键 -> [剩余令牌, 上次补充令牌的时间, 被限流的条数]
+        self._buckets: Dict[Any, List[float]] = {}
+        self._last = None
+        self._last_record: Optional[logging.LogRecord] = None
+        self._repeats = 0
+        self._checked = threading.local()
+
+    def _allow(self, levelno: int, key: Any, now: float) -> bool:
+        """
+        DEBUG采样和令牌桶限流，调用者需持有锁
+        """
+        if levelno == logging.DEBUG and self.debug_sample_rate < 1.0 and random.random() >= self.debug_sample_rate:
+            return False
+        if self.rate_limit is None:
+            return True
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= _MAX_RATE_LIMIT_KEYS:
+                self._buckets.clear()
+            bucket = self._buckets[key] = [self.rate_limit_burst, now, 0]
+        else:
+            bucket[0] = min(self.rate_limit_burst, bucket[0] + (now - bucket[1]) * self.rate_limit)
+            bucket[1] = now
+        if bucket[0] < 1.0:
+            bucket[2] += 1
+            return False
+        bucket[0] -= 1.0
+        return True
+
+    def _suppressed(self, key: Any) -> int:
+        bucket = self._buckets.get(key)
+        if bucket is None or not bucket[2]:
+            return 0
+        suppressed, bucket[2] = bucket[2], 0
+        return int(suppressed)
+
+    def allow_call(self, levelno: int, frame: Any, msg: Any) -> bool:
+        """
+        在创建LogRecord之前检查SimpleLogger类方法的调用，被限流的调用不再创建日志记录
+
+        Args:
+            levelno: 日志等级
+            frame: 调用者的栈帧
+            msg: 日志消息
+
+        Returns:
+            是否输出这条日志
+        """
+        key = (frame.f_code.co_filename, frame.f_lineno) if self.by_site else getattr(msg, "__code__", msg)
+        with self._lock:
+            allowed = self._allow(levelno, key, time.time())
+        # 通过检查的调用接下来会创建日志记录，filter不再重复采样和限流
+        self._checked.key = key if allowed else None
+        return allowed
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.__dict__.get("_simple_logger_summary"):
+            return True
+        checked_key = getattr(self._checked, "key", None)
+        self._checked.key = None
+        summary = None
+        with self._lock:
+            if self.collapse_repeats:
+                current = (record.levelno, record.pathname, record.lineno, record.msg, record.args)
+                if current == self._last:
+                    self._repeats += 1
+                    return False
+                if self._repeats:
+                    summary = self._summary(self._last_record, self._repeats)
+                self._last = current
+                self._last_record = record
+                self._repeats = 0
+            if checked_key is not None:
+                key = checked_key
+            else:
+                key = (record.pathname, record.lineno) if self.by_site else record.msg
+                if not self._allow(record.levelno, key, record.created):
+                    record = None
+            suppressed = self._suppressed(key) if record is not None else 0
+        if record is not None and suppressed:
+            record.msg = "%s (%d similar messages suppressed)" % (record.getMessage(), suppressed)
+            record.args = None
+        if summary is not None:
+            self.logger.handle(summary)
+        return record is not None
+
+    @staticmethod
+    def _summary(record: logging.LogRecord, repeats: int) -> logging.LogRecord:
+        summary = logging.makeLogRecord(record.__dict__)
+        summary.msg = "last message repeated %d times"
+        summary.args = (repeats,)
+        summary.exc_info = summary.exc_text = summary.stack_info = None
+        summary.created = time.time()
+        summary._simple_logger_summary = True
+        return summary
 
 
 class SimpleLogger:
     _default_logger: logging.Logger = None
+    # 默认日志记录器实际输出的最低等级的缓存，由reset_level和as_default更新，低于它的调用直接返回
+    _default_level: int = 0
+    # 默认日志记录器的限流过滤器，类方法在创建日志记录之前检查限流
+    _default_limiter: Optional[_RateLimitFilter] = None
 
     def __init__(self,
                  logger_name: str,
@@ -11,7 +1067,23 @@ class SimpleLogger:
                  file_max_bytes: int = 9 * 1024 * 1024,
                  file_backup_count: int = 5,
                  log_level=logging.DEBUG,
-                 formatter: str = "[%(asctime)s][%(name)s][%(process)d][%(levelname)s] %(message)s"):
+                 formatter: str = "[%(asctime)s][%(name)s][%(process)d][%(levelname)s] %(message)s",
+                 async_mode: bool = False,
+                 async_queue_size: int = 10000,
+                 flush_interval: float = 0.5,
+                 overflow: str = OVERFLOW_BLOCK,
+                 json_format: bool = False,
+                 file_rotate_interval: float = None,
+                 compress_backups: bool = False,
+                 aggregator_address: str = None,
+                 rate_limit: float = None,
+                 rate_limit_burst: int = None,
+                 rate_limit_key: str = RATE_LIMIT_BY_SITE,
+                 debug_sample_rate: float = 1.0,
+                 collapse_repeats: bool = False,
+                 flight_recorder_size: int = 0,
+                 flight_recorder_file: str = None,
+                 flight_recorder_signal: int = None):
         """
         初始化日志记录器
 
@@ -22,6 +1094,33 @@ class SimpleLogger:
             file_backup_count: 保留的备份日志文件数量（默认为 5）
             log_level: 日志输出的最低等级限制（默认为 DEBUG 级别）
             formatter: 日志格式化字符串（默认格式为 "[%(asctime)s][%(name)s][%(process)d][%(levelname)s] %(message)s"）
+            async_mode: 异步模式，日志由后台线程批量格式化和写入，调用线程不再等待写文件和滚动（默认为 False）
+            async_queue_size: 异步模式下队列中最多缓存的日志条数（默认为 10000）
+            flush_interval: 异步模式下日志在队列中等待批量写入的最长时间，单位为秒（默认为 0.5）
+            overflow: 异步模式下队列已满时的策略（默认为 OVERFLOW_BLOCK）
+                OVERFLOW_BLOCK: 阻塞调用者直到队列有空位，不丢失日志
+                OVERFLOW_DROP_NEWEST: 丢弃新日志
+                OVERFLOW_DROP_OLDEST: 丢弃队列中最旧的日志
+                丢弃的条数会在下一批日志中以一条警告记录
+            json_format: 日志文件使用JsonFormatter，每行一条JSON日志，可用LogReader按时间查询（默认为 False）
+            file_rotate_interval: 日志文件按时间滚动的间隔，单位为秒（默认为 None，只按大小滚动）
+            compress_backups: 在后台线程将滚动后的日志文件压缩为gzip（默认为 False）
+                指定file_rotate_interval或compress_backups时，滚动后的文件按滚动时间命名，
+                如 my_logger.log.20240101-000000-000000.gz，file_backup_count为0时保留全部
+            aggregator_address: LogAggregator监听的Unix套接字路径，指定后日志通过非阻塞的套接字发送给汇聚器，
+                由汇聚器进程统一写入日志文件，用于多个进程写同一个日志文件（默认为 None）
+            rate_limit: 每个调用位置（或消息模板）每秒最多输出的日志条数，被限流的条数会附加在下一条输出的日志中
+                （默认为 None，不限流）
+            rate_limit_burst: 每个调用位置允许的突发条数（默认为 None，与rate_limit相同）
+            rate_limit_key: 限流的键，RATE_LIMIT_BY_SITE按文件和行号，RATE_LIMIT_BY_TEMPLATE按消息模板
+                （默认为 RATE_LIMIT_BY_SITE）
+            debug_sample_rate: DEBUG日志的采样概率，如0.01只输出约1%的DEBUG日志（默认为 1.0，全部输出）
+            collapse_repeats: 将连续重复的日志合并为一条“last message repeated N times”（默认为 False）
+            flight_recorder_size: 飞行记录器缓冲区的字节数，大于0时在内存中记录所有等级的日志，
+                出现ERROR及以上的日志、未处理的异常或flight_recorder_signal信号时转储到日志文件（默认为 0，不启用）
+                启用后logger的等级为DEBUG，log_level只作用于处理器
+            flight_recorder_file: 飞行记录器映射的文件，进程崩溃后可用FlightRecorder.load读取（默认为 None，使用匿名内存）
+            flight_recorder_signal: 触发转储的信号，如signal.SIGUSR1（默认为 None）
         """
         # 检索（如果不存在则创建）具有指定名称的logger
         self._logger = logging.getLogger(logger_name)
@@ -29,30 +1128,81 @@ class SimpleLogger:
 
         # 如果logger已经有handlers，那么就不需要再添加新的handlers
         if not self._logger.handlers:
+            handlers = []
             # 创建一个handler，用于将日志输出到控制台
             console_handler = logging.StreamHandler()
-            self._add_handler(console_handler, "console_handler", log_level, formatter)
+            handlers.append(self._init_handler(console_handler, "console_handler", log_level, formatter))
 
             # 如果指定了日志文件路径，则创建一个handler，用于将日志输出到文件
             if log_file:
                 # 创建一个handler，用于写入日志文件
-                file_handler = RotatingFileHandler(log_file, maxBytes=file_max_bytes, backupCount=file_backup_count)
-                self._add_handler(file_handler, "file_handler", log_level, formatter)
+                file_handler = _create_file_handler(log_file, file_max_bytes, file_backup_count,
+                                                    file_rotate_interval, compress_backups)
+                handlers.append(self._init_handler(file_handler, "file_handler", log_level, formatter))
+                if json_format:
+                    file_handler.setFormatter(JsonFormatter())
+
+            # 如果指定了日志汇聚器的地址，则创建一个handler，将日志发送给汇聚器，由它写入日志文件
+            if aggregator_address:
+                aggregator_handler = _UnixStreamHandler(aggregator_address)
+                handlers.append(self._init_handler(aggregator_handler, "aggregator_handler", log_level, formatter))
+
+            if async_mode:
+                # 异步模式下logger只有一个异步处理器，由它在后台线程调用上面的处理器
+                async_handler = _AsyncBatchHandler(handlers, async_queue_size, flush_interval, overflow=overflow)
+                handlers = [self._init_handler(async_handler, "async_handler", log_level, formatter)]
+            for handler in handlers:
+                self._logger.addHandler(handler)
+
+            if flight_recorder_size > 0:
+                # 转储到日志文件，没有日志文件时转储到控制台
+                file_handlers = [inner for handler in handlers for inner in self._unwrap(handler)
+                                 if isinstance(inner, logging.FileHandler)]
+                recorder = FlightRecorder(flight_recorder_size, flight_recorder_file,
+                                          dump_handlers=file_handlers or [console_handler])
+                self._init_handler(recorder, "flight_recorder", logging.NOTSET, formatter)
+                recorder.install_hooks(flight_recorder_signal)
+                self._logger.addHandler(recorder)
+                self._logger.setLevel(logging.DEBUG)
 
-    def _add_handler(self, handler: logging.Handler, name: str, level: int, formatter: str):
+            if rate_limit is not None or debug_sample_rate < 1.0 or collapse_repeats:
+                self._logger.addFilter(_RateLimitFilter(self._logger, rate_limit, rate_limit_burst, rate_limit_key,
+                                                        debug_sample_rate, collapse_repeats))
+
+    @staticmethod
+    def _init_handler(handler: logging.Handler, name: str, level: int, formatter: str) -> logging.Handler:
         """
-        添加日志处理器
+        初始化日志处理器
 
         Args:
             handler: 日志处理器
             name: 日志处理器的名称
             level: 日志输出的最低等级限制
             formatter: 日志格式化字符串
+
+        Returns:
+            日志处理器
         """
         handler.set_name(name)
         handler.setLevel(level)
         handler.setFormatter(logging.Formatter(formatter))
-        self._logger.addHandler(handler)
+        return handler
+
+    @staticmethod
+    def _unwrap(handler: logging.Handler) -> List[logging.Handler]:
+        """
+        获取处理器本身及异步处理器包装的处理器
+        """
+        if isinstance(handler, _AsyncBatchHandler):
+            return [handler] + handler.handlers
+        return [handler]
+
+    def _iter_handlers(self) -> Iterator[logging.Handler]:
+        """
+        遍历日志处理器，包括异步处理器包装的处理器
+        """
+        for handler in self._logger.handlers:
+            yield from self._unwrap(handler)
 
     @property
     def logger(self):
@@ -71,20 +1221,34 @@ class SimpleLogger:
         Args:
             level: 日志输出的最低等级限制
         """
-        self._logger.setLevel(level)
-        for handler in self._logger.handlers:
-            handler.setLevel(level)
+        recording = False
+        for handler in self._iter_handlers():
+            if isinstance(handler, FlightRecorder):
+                # 飞行记录器记录所有等级
+                recording = True
+            else:
+                handler.setLevel(level)
+        self._logger.setLevel(logging.DEBUG if recording else level)
+        SimpleLogger._refresh_default_level()
 
     def reset_formatter(self, formatter: str):
         """
-        重设日志格式化字符串
+        重设日志格式化字符串，使用JsonFormatter的处理器不受影响
 
         Args:
             formatter: 日志格式化字符串
         """
         formatter = logging.Formatter(formatter)
+        for handler in self._iter_handlers():
+            if not isinstance(handler.formatter, JsonFormatter):
+                handler.setFormatter(formatter)
+
+    def flush(self):
+        """
+        将日志处理器中缓存的日志写出，异步模式下等待队列中的日志全部写入
+        """
         for handler in self._logger.handlers:
-            handler.setFormatter(formatter)
+            handler.flush()
 
     def clear_handlers(self):
         """
@@ -92,6 +1256,7 @@ class SimpleLogger:
         """
         for handler in self._logger.handlers[:]:
             # 创建副本是为了避免在迭代过程中删除处理器导致列表大小发生变化，无法正确遍历列表
+            # 异步处理器在关闭时会先写完队列中的日志；解释器退出时logging.shutdown同样会关闭它
             handler.close()
             self._logger.removeHandler(handler)
 
@@ -100,6 +1265,43 @@ class SimpleLogger:
         将日志记录器设置为默认的日志记录器
         """
         SimpleLogger._default_logger = self._logger
+        SimpleLogger._refresh_default_level()
+
+    @classmethod
+    def _refresh_default_level(cls):
+        """
+        更新默认日志记录器的等级缓存，直接调用logger.setLevel或logging.disable后需要调用它
+        """
+        logger = cls._default_logger
+        cls._default_limiter = None
+        if logger is None:
+            cls._default_level = 0
+        else:
+            for log_filter in logger.filters:
+                if isinstance(log_filter, _RateLimitFilter):
+                    cls._default_limiter = log_filter
+            # logging.disable(level)会禁用level及以下的等级
+            cls._default_level = max(logger.getEffectiveLevel(), logger.manager.disable + 1)
+
+    @classmethod
+    def _log(cls, level, msg, args, kwargs):
+        """
+        输出已启用等级的日志，被限流的调用直接返回
+
+        Args:
+            level: 日志等级
+            msg: 日志消息，可以是返回消息的函数
+            args: 消息的%格式化参数
+            kwargs: 其他参数
+        """
+        limiter = cls._default_limiter
+        if limiter is not None and not limiter.allow_call(level, sys._getframe(2), msg):
+            return
+        if callable(msg):
+            msg = msg()
+        # 跳过这个方法和调用它的类方法，日志的调用位置是类方法的调用者
+        kwargs["stacklevel"] = kwargs.get("stacklevel", 1) + 2
+        cls._default_logger.log(level, msg, *args, **kwargs)
 
     @classmethod
     def debug(cls, msg, *args, **kwargs):
@@ -107,11 +1309,13 @@ class SimpleLogger:
         输出调试信息
 
         Args:
-            msg: 调试信息
-            *args: 其他参数
+            msg: 调试信息，可以是返回消息的函数，仅在等级启用时调用
+            *args: 消息的%格式化参数，仅在等级启用时格式化
             **kwargs: 其他参数
         """
-        cls._default_logger.debug(msg, *args, **kwargs)
+        if logging.DEBUG < cls._default_level:
+            return
+        cls._log(logging.DEBUG, msg, args, kwargs)
 
     @classmethod
     def info(cls, msg, *args, **kwargs):
@@ -119,11 +1323,13 @@ class SimpleLogger:
         输出信息
 
         Args:
-            msg: 信息
-            *args: 其他参数
+            msg: 信息，可以是返回消息的函数，仅在等级启用时调用
+            *args: 消息的%格式化参数，仅在等级启用时格式化
             **kwargs: 其他参数
         """
-        cls._default_logger.info(msg, *args, **kwargs)
+        if logging.INFO < cls._default_level:
+            return
+        cls._log(logging.INFO, msg, args, kwargs)
 
     @classmethod
     def warning(cls, msg, *args, **kwargs):
@@ -131,11 +1337,13 @@ class SimpleLogger:
         输出警告信息
 
         Args:
-            msg: 警告信息
-            *args: 其他参数
+            msg: 警告信息，可以是返回消息的函数，仅在等级启用时调用
+            *args: 消息的%格式化参数，仅在等级启用时格式化
             **kwargs: 其他参数
         """
-        cls._default_logger.warning(msg, *args, **kwargs)
+        if logging.WARNING < cls._default_level:
+            return
+        cls._log(logging.WARNING, msg, args, kwargs)
 
     @classmethod
     def error(cls, msg, *args, **kwargs):
@@ -143,11 +1351,13 @@ class SimpleLogger:
         输出错误信息
 
         Args:
-            msg: 错误信息
-            *args: 其他参数
+            msg: 错误信息，可以是返回消息的函数，仅在等级启用时调用
+            *args: 消息的%格式化参数，仅在等级启用时格式化
             **kwargs: 其他参数
         """
-        cls._default_logger.error(msg, *args, **kwargs)
+        if logging.ERROR < cls._default_level:
+            return
+        cls._log(logging.ERROR, msg, args, kwargs)
 
     @classmethod
     def critical(cls, msg, *args, **kwargs):
@@ -155,11 +1365,13 @@ class SimpleLogger:
         输出严重错误信息
 
         Args:
-            msg: 严重错误信息
-            *args: 其他参数
+            msg: 严重错误信息，可以是返回消息的函数，仅在等级启用时调用
+            *args: 消息的%格式化参数，仅在等级启用时格式化
             **kwargs: 其他参数
         """
-        cls._default_logger.critical(msg, *args, **kwargs)
+        if logging.CRITICAL < cls._default_level:
+            return
+        cls._log(logging.CRITICAL, msg, args, kwargs)
 
 
 if __name__ == "__main__":
@@ -181,6 +1393,12 @@ if __name__ == "__main__":
     simple_logger.reset_formatter("[%(name)s][%(process)d][%(levelname)s] %(message)s")  # 重设日志格式化字符串
     simple_logger.as_default()  # 将日志记录器设置为默认的日志记录器
 
+    # 禁用的等级直接返回，延迟格式化的参数和返回消息的函数都不会被求值
+    simple_logger.reset_level(logging.INFO)
+    SimpleLogger.debug("Skipped debug: %s", threading.enumerate())
+    SimpleLogger.debug(lambda: "Skipped debug: %s" % threading.enumerate())
+    simple_logger.reset_level(logging.DEBUG)
+
     # 多线程使用默认日志记录器
     threads = []
     for i in range(10):
@@ -1,4 +1,24 @@
 try:
-    from concurrent.futures import ThreadPoolExecutor
+    from concurrent.futures import (
+        ALL_COMPLETED,
+        FIRST_COMPLETED,
+        FIRST_EXCEPTION,
+        CancelledError,
+        Future,
+        ProcessPoolExecutor,
+        ThreadPoolExecutor,
+        as_completed,
+        wait,
+    )
 except ImportError:
-    from simple_thread_pool import ThreadPoolExecutor
+    from .simple_thread_pool import (
+        ALL_COMPLETED,
+        FIRST_COMPLETED,
+        FIRST_EXCEPTION,
+        CancelledError,
+        Future,
+        ThreadPoolExecutor,
+        as_completed,
+        wait,
+    )
+    from .simple_process_pool import ProcessPoolExecutor
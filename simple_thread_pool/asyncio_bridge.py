@@ -0,0 +1,110 @@
+import asyncio
+import functools
+from typing import Any, Callable, Optional, Union
+
+from .simple_process_pool import ProcessPoolExecutor
+from .simple_thread_pool import Future, ThreadPoolExecutor
+
+
+def _copy_state(source: Future, destination: asyncio.Future) -> None:
+    """Copy the outcome of a pool future into an asyncio future, runs in the event loop thread."""
+    if destination.cancelled():
+        return
+    if source.cancelled():
+        destination.cancel()
+        return
+    exception = source.exception()
+    if exception is not None:
+        destination.set_exception(exception)
+    else:
+        destination.set_result(source.result())
+
+
+def wrap_future(future: Future, loop: Optional[asyncio.AbstractEventLoop] = None) -> asyncio.Future:
+    """Wrap a pool future into an asyncio future.
+
+    The worker that completes the future hands the result to the event loop with
+    `call_soon_threadsafe`, so no thread blocks on `result()`. Cancelling the asyncio
+    future cancels the pool future if it has not started yet.
+
+    Args:
+        future (Future): The pool future.
+        loop (asyncio.AbstractEventLoop, optional): The event loop of the asyncio future. Defaults to the running loop.
+
+    Returns:
+        asyncio.Future: A future that can be awaited from `loop`.
+    """
+    if isinstance(future, asyncio.Future):
+        return future
+    if loop is None:
+        loop = asyncio.get_running_loop()
+    aio_future = loop.create_future()
+
+    def on_done(done: Future) -> None:
+        try:
+            loop.call_soon_threadsafe(_copy_state, done, aio_future)
+        except RuntimeError:
+            # The event loop was closed, nobody is waiting anymore
+            pass
+
+    def on_aio_done(done: asyncio.Future) -> None:
+        if done.cancelled():
+            future.cancel()
+
+    aio_future.add_done_callback(on_aio_done)
+    future.add_done_callback(on_done)
+    return aio_future
+
+
+def set_default_executor(executor: Union[ThreadPoolExecutor, ProcessPoolExecutor],
+                         loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+    """Use `executor` for `loop.run_in_executor(None, ...)`.
+
+    `loop.set_default_executor` only accepts `concurrent.futures.ThreadPoolExecutor`, so this
+    replaces the loop's `run_in_executor` instead. Explicitly passed executors of this package
+    are supported as well, other executors go through the original method. The caller still owns
+    `executor` and shuts it down.
+
+    Args:
+        executor (Union[ThreadPoolExecutor, ProcessPoolExecutor]): The executor.
+        loop (asyncio.AbstractEventLoop, optional): The event loop. Defaults to the running loop.
+    """
+    if loop is None:
+        loop = asyncio.get_running_loop()
+    original = getattr(loop.run_in_executor, "_original", loop.run_in_executor)
+
+    @functools.wraps(original)
+    def run_in_executor(target: Any, func: Callable[..., Any], *args: Any) -> asyncio.Future:
+        if target is None:
+            target = executor
+        if isinstance(target, (ThreadPoolExecutor, ProcessPoolExecutor)):
+            return wrap_future(target.submit(func, *args), loop=loop)
+        return original(target, func, *args)
+
+    run_in_executor._original = original
+    loop.run_in_executor = run_in_executor
+
+
+if __name__ == "__main__":
+    import time
+
+
+    def blocking_io(seconds: float) -> float:
+        time.sleep(seconds)
+        return seconds
+
+
+    async def main() -> None:
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            # Await pool futures directly, or through the run coroutine
+            print(await executor.submit(blocking_io, 0.1))
+            print(await executor.run(blocking_io, 0.2))
+
+            # Route loop.run_in_executor(None, ...) to the pool
+            set_default_executor(executor)
+            loop = asyncio.get_running_loop()
+            results = await asyncio.gather(*(loop.run_in_executor(None, blocking_io, 0.1) for _ in range(8)))
+            print(results)
+
+
+    asyncio.run(main())
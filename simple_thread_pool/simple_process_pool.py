@@ -0,0 +1,411 @@
+import os
+import threading
+import collections
+import multiprocessing
+from multiprocessing.connection import Connection, wait as wait_connections
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:
+    # Python < 3.8
+    shared_memory = None
+
+from .simple_thread_pool import Future, _lazy_map
+
+
+class BrokenProcessPool(RuntimeError):
+    """A worker process died while running tasks."""
+
+
+class _SharedBuffer:
+    def __init__(self, name: str, size: int, kind: str) -> None:
+        """Reference to an argument that was copied into a shared memory block.
+
+        Args:
+            name (str): Name of the shared memory block.
+            size (int): Size of the argument in bytes.
+            kind (str): Type to rebuild in the worker, "bytes" or "memoryview".
+        """
+        self.name = name
+        self.size = size
+        self.kind = kind
+
+
+def _open_shared_memory(name: str) -> Any:
+    """Attach to a shared memory block owned by the parent, without tracking it in the worker."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 always registers the block. Workers usually share the parent's resource tracker
+        # (fork after it started, spawn and forkserver pass its fd), where unregistering would drop the
+        # parent's registration; a tracker of the worker's own would unlink the block on exit. Skip the
+        # registration instead, the worker attaches blocks from a single thread.
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+def _attach_shared_buffers(args: tuple, kwargs: Dict[str, Any]) -> Tuple[tuple, Dict[str, Any], list]:
+    """Replace the `_SharedBuffer` arguments by the data of their shared memory blocks."""
+    blocks = []
+
+    def attach(value: Any) -> Any:
+        if not isinstance(value, _SharedBuffer):
+            return value
+        block = _open_shared_memory(value.name)
+        blocks.append(block)
+        view = block.buf[:value.size]
+        if value.kind == "bytes":
+            data = bytes(view)
+            view.release()
+            return data
+        return view
+
+    args = tuple(attach(arg) for arg in args)
+    kwargs = {key: attach(value) for key, value in kwargs.items()}
+    return args, kwargs, blocks
+
+
+def _release_shared_buffers(args: tuple, kwargs: Dict[str, Any], blocks: list) -> None:
+    for value in list(args) + list(kwargs.values()):
+        if isinstance(value, memoryview):
+            value.release()
+    for block in blocks:
+        try:
+            block.close()
+        except BufferError:
+            # The function kept a reference to the buffer, the block is unmapped when the worker exits
+            pass
+
+
+def _process_worker(conn: Connection) -> None:
+    """Main loop of a worker process.
+
+    Receives a batch of (task_id, func, args, kwargs) tuples and sends back a single batch
+    of (task_id, succeeded, result_or_exception) tuples. None stops the worker.
+    """
+    while True:
+        try:
+            batch = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        if batch is None:
+            return
+        results = []
+        for task_id, func, args, kwargs in batch:
+            blocks: list = []
+            try:
+                args, kwargs, blocks = _attach_shared_buffers(args, kwargs)
+                results.append((task_id, True, func(*args, **kwargs)))
+            except BaseException as e:
+                results.append((task_id, False, e))
+            finally:
+                _release_shared_buffers(args, kwargs, blocks)
+        try:
+            conn.send(results)
+        except Exception as e:
+            # Some result could not be pickled, report the error for every task of the batch
+            conn.send([(task_id, False, e) for task_id, _, _ in results])
+
+
+class _WorkerProcess:
+    def __init__(self, context: Any) -> None:
+        """A persistent worker process and the parent's end of its pipe."""
+        self.conn, child_conn = context.Pipe(duplex=True)
+        self.process = context.Process(target=_process_worker, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        # Tasks sent to the worker whose results have not been received yet
+        self.in_flight: List[int] = []
+
+
+class _ProcessTask:
+    def __init__(self, func: Callable[..., Any], args: tuple, kwargs: Dict[str, Any]) -> None:
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.shared_blocks: list = []
+
+
+class ProcessPoolExecutor:
+    def __init__(self,
+                 max_workers: Optional[int] = None,
+                 batch_size: int = 16,
+                 shared_memory_threshold: Optional[int] = 1024 * 1024,
+                 mp_context: Any = None) -> None:
+        """Create a process pool executor, with the same API as `ThreadPoolExecutor`.
+
+        Worker processes are started on the first submit and stay alive until shutdown.
+        Tasks are sent to the workers in batches over pipes and results come back in batches.
+        Bytes-like arguments of at least `shared_memory_threshold` bytes are passed through
+        `multiprocessing.shared_memory` instead of being pickled through the pipe: `bytes`
+        arguments arrive as `bytes`, other buffers as a `memoryview` that is only valid
+        during the call.
+
+        Args:
+            max_workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+            batch_size (int, optional): Maximum number of tasks sent to a worker at once. Defaults to 16.
+            shared_memory_threshold (int, optional): Minimum size in bytes of the arguments passed through
+                shared memory, None disables it. Defaults to 1 MiB.
+            mp_context (optional): The multiprocessing context used to start the workers. Defaults to the
+                default context.
+        """
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        if max_workers <= 0:
+            raise ValueError("max_workers must be greater than 0")
+        if batch_size <= 0:
+            raise ValueError("batch_size must be greater than 0")
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.shared_memory_threshold = shared_memory_threshold if shared_memory is not None else None
+        self._context = mp_context or multiprocessing.get_context()
+        self._workers: List[_WorkerProcess] = []
+        self._pending: Deque[int] = collections.deque()
+        self._tasks: Dict[int, _ProcessTask] = {}
+        self._next_task_id = 0
+        self._manager: Optional[threading.Thread] = None
+        self._wakeup_reader, self._wakeup_writer = self._context.Pipe(duplex=False)
+        self._wakeup_pending = False
+        self._shutdown = False
+        self._shutdown_lock = threading.Lock()
+
+    def _share_argument(self, value: Any, task: _ProcessTask) -> Any:
+        """Copy a large bytes-like argument into shared memory and return the reference sent to the worker."""
+        if not isinstance(value, (bytes, bytearray, memoryview)):
+            return value
+        size = value.nbytes if isinstance(value, memoryview) else len(value)
+        if size < self.shared_memory_threshold or size == 0:
+            return value
+        block = shared_memory.SharedMemory(create=True, size=size)
+        task.shared_blocks.append(block)
+        block.buf[:size] = memoryview(value).cast("B")
+        return _SharedBuffer(block.name, size, "bytes" if isinstance(value, bytes) else "memoryview")
+
+    @staticmethod
+    def _free_shared_blocks(task: _ProcessTask) -> None:
+        for block in task.shared_blocks:
+            block.close()
+            block.unlink()
+        task.shared_blocks = []
+
+    def submit(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        """Submit a task to the process pool and return a Future object.
+
+        Args:
+            func (Callable): The function to execute, must be picklable.
+            *args: Positional arguments for the function, must be picklable.
+            **kwargs: Keyword arguments for the function, must be picklable.
+
+        Returns:
+            Future: A Future object representing the task's result.
+        """
+        if not callable(func):
+            raise TypeError("func must be a callable function")
+        task = _ProcessTask(func, args, kwargs)
+        if self.shared_memory_threshold is not None:
+            task.args = tuple(self._share_argument(arg, task) for arg in args)
+            task.kwargs = {key: self._share_argument(value, task) for key, value in kwargs.items()}
+        with self._shutdown_lock:
+            if self._shutdown:
+                self._free_shared_blocks(task)
+                raise RuntimeError("Cannot submit after shutdown")
+            task_id = self._next_task_id
+            self._next_task_id += 1
+            self._tasks[task_id] = task
+            self._pending.append(task_id)
+            if self._manager is None:
+                self._start()
+            self._wakeup()
+        return task.future
+
+    async def run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run a task in the pool and await its result from asyncio code.
+
+        Args:
+            func (Callable): The function to execute, must be picklable.
+            *args: Positional arguments for the function.
+            **kwargs: Keyword arguments for the function.
+
+        Returns:
+            Any: The value returned by the function.
+        """
+        return await self.submit(func, *args, **kwargs)
+
+    def map(self,
+            func: Callable[..., Any],
+            *iterables: Iterable[Any],
+            timeout: Optional[float] = None,
+            chunksize: int = 1,
+            prefetch: Optional[int] = None) -> Iterator[Any]:
+        """Return an iterator equivalent to map(func, *iterables), executed by the pool.
+
+        Args:
+            func (Callable): The function to execute, must be picklable.
+            *iterables: Iterables yielding the arguments for `func`.
+            timeout (float, optional): Maximum seconds to wait, counted from the call to map. Defaults to None.
+            chunksize (int, optional): Number of items handed to a worker as a single task. Defaults to 1.
+            prefetch (int, optional): Number of tasks kept in flight. Defaults to twice max_workers times batch_size.
+
+        Returns:
+            Iterator[Any]: The results, in the order of the input.
+        """
+        if prefetch is None:
+            prefetch = 2 * self.max_workers * self.batch_size
+        return _lazy_map(self.submit, func, iterables, timeout, chunksize, prefetch)
+
+    def _start(self) -> None:
+        """Start the worker processes and the manager thread. Must be called with `_shutdown_lock` held."""
+        for _ in range(self.max_workers):
+            self._workers.append(_WorkerProcess(self._context))
+        self._manager = threading.Thread(target=self._manage, daemon=True)
+        self._manager.start()
+
+    def _wakeup(self) -> None:
+        """Wake up the manager thread. Must be called with `_shutdown_lock` held."""
+        if not self._wakeup_pending:
+            self._wakeup_pending = True
+            self._wakeup_writer.send_bytes(b"")
+
+    def _manage(self) -> None:
+        """Manager thread, dispatches batches to idle workers and completes the futures with their results."""
+        while True:
+            with self._shutdown_lock:
+                failed = self._dispatch()
+            for task_id, error in failed:
+                self._finish(task_id, False, error)
+            with self._shutdown_lock:
+                if self._shutdown and not self._pending and not any(w.in_flight for w in self._workers):
+                    break
+                connections = [worker.conn for worker in self._workers]
+            for conn in wait_connections(connections + [self._wakeup_reader]):
+                if conn is self._wakeup_reader:
+                    self._wakeup_reader.recv_bytes()
+                    with self._shutdown_lock:
+                        self._wakeup_pending = False
+                    continue
+                worker = next(w for w in self._workers if w.conn is conn)
+                try:
+                    results = conn.recv()
+                except (EOFError, OSError):
+                    self._replace_worker(worker)
+                    continue
+                self._complete(worker, results)
+
+        for worker in self._workers:
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+        for worker in self._workers:
+            worker.process.join()
+            worker.conn.close()
+
+    def _dispatch(self) -> List[Tuple[int, BaseException]]:
+        """Send pending tasks to the idle workers. Must be called with `_shutdown_lock` held.
+
+        Returns:
+            List[Tuple[int, BaseException]]: The tasks that could not be sent, to be failed without the lock held.
+        """
+        failed = []
+        idle_workers = [worker for worker in self._workers if not worker.in_flight]
+        for index, worker in enumerate(idle_workers):
+            if not self._pending:
+                break
+            # Spread the pending tasks evenly, so a few tasks do not end up in a single batch
+            share = -(-len(self._pending) // (len(idle_workers) - index))
+            batch = []
+            while self._pending and len(batch) < min(share, self.batch_size):
+                task_id = self._pending.popleft()
+                task = self._tasks[task_id]
+                if not task.future.set_running_or_notify_cancel():
+                    del self._tasks[task_id]
+                    self._free_shared_blocks(task)
+                    continue
+                batch.append((task_id, task.func, task.args, task.kwargs))
+                worker.in_flight.append(task_id)
+            if not batch:
+                continue
+            try:
+                worker.conn.send(batch)
+            except Exception as e:
+                # The batch could not be pickled or the worker is gone
+                failed.extend((task_id, e) for task_id in worker.in_flight)
+                worker.in_flight = []
+        return failed
+
+    def _finish(self, task_id: int, succeeded: bool, value: Any) -> None:
+        """Complete the future of a task, must be called without `_shutdown_lock` held as it runs the callbacks."""
+        with self._shutdown_lock:
+            task = self._tasks.pop(task_id)
+        self._free_shared_blocks(task)
+        if succeeded:
+            task.future.set_result(value)
+        else:
+            task.future.set_exception(value)
+
+    def _complete(self, worker: _WorkerProcess, results: List[Tuple[int, bool, Any]]) -> None:
+        with self._shutdown_lock:
+            worker.in_flight = []
+        for task_id, succeeded, value in results:
+            self._finish(task_id, succeeded, value)
+
+    def _replace_worker(self, worker: _WorkerProcess) -> None:
+        """Fail the tasks of a dead worker and start a new worker in its place."""
+        worker.process.join()
+        worker.conn.close()
+        with self._shutdown_lock:
+            lost = worker.in_flight
+            index = self._workers.index(worker)
+            self._workers[index] = _WorkerProcess(self._context)
+        error = BrokenProcessPool(f"Worker process exited with code {worker.process.exitcode}")
+        for task_id in lost:
+            self._finish(task_id, False, error)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Shut down the process pool once the submitted tasks are done.
+
+        Args:
+            wait (bool, optional): Block until the worker processes have exited. Defaults to True.
+        """
+        with self._shutdown_lock:
+            if not self._shutdown:
+                self._shutdown = True
+                if self._manager is not None:
+                    self._wakeup()
+            manager = self._manager
+        if wait and manager is not None:
+            manager.join()
+
+    def __enter__(self) -> "ProcessPoolExecutor":
+        return self
+
+    def __exit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        self.shutdown()
+
+
+if __name__ == "__main__":
+    import time
+
+
+    def cpu_bound(n: int) -> int:
+        return sum(i * i for i in range(n))
+
+
+    def checksum(data: bytes) -> int:
+        return sum(data[::4096])
+
+
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        start = time.time()
+        results = list(executor.map(cpu_bound, [2000000] * 8))
+        print(f"map: {len(results)} results in {time.time() - start:.2f}s")
+
+        # The 64 MiB buffer goes through shared memory instead of the pipe
+        future = executor.submit(checksum, os.urandom(64 * 1024 * 1024))
+        print(f"checksum: {future.result()}")
@@ -1,101 +1,976 @@
 import threading
-import queue
-from typing import Any, Callable, List, Optional
+import collections
+import heapq
+import itertools
+import logging
+import random
+import time
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional
 
 
-class Task:
+PENDING = "PENDING"
+RUNNING = "RUNNING"
+CANCELLED = "CANCELLED"
+FINISHED = "FINISHED"
+# Finished with an exception, reported as FINISHED
+_FAILED = "FAILED"
+_DONE_STATES = frozenset((CANCELLED, FINISHED, _FAILED))
+
+FIRST_COMPLETED = "FIRST_COMPLETED"
+FIRST_EXCEPTION = "FIRST_EXCEPTION"
+ALL_COMPLETED = "ALL_COMPLETED"
+_AS_COMPLETED = "_AS_COMPLETED"
+
+TASK_COMPLETED = "TASK_COMPLETED"
+TASK_FAILED = "TASK_FAILED"
+TASK_DROPPED = "TASK_DROPPED"
+
+DoneAndNotDoneFutures = collections.namedtuple("DoneAndNotDoneFutures", "done not_done")
+
+_logger = logging.getLogger(__name__)
+
+
+class CancelledError(Exception):
+    """The Future was cancelled."""
+
+
+class _Waiter:
+    def __init__(self) -> None:
+        """Collect futures as they complete, used by `wait` and `as_completed`."""
+        self.event = threading.Event()
+        self.finished_futures: List["Future"] = []
+
+    def add_result(self, future: "Future") -> None:
+        self.finished_futures.append(future)
+
+    def add_exception(self, future: "Future") -> None:
+        self.finished_futures.append(future)
+
+    def add_cancelled(self, future: "Future") -> None:
+        self.finished_futures.append(future)
+
+
+class _AsCompletedWaiter(_Waiter):
+    def __init__(self) -> None:
+        super().__init__()
+        self.lock = threading.Lock()
+
+    def add_result(self, future: "Future") -> None:
+        with self.lock:
+            super().add_result(future)
+            self.event.set()
+
+    def add_exception(self, future: "Future") -> None:
+        with self.lock:
+            super().add_exception(future)
+            self.event.set()
+
+    def add_cancelled(self, future: "Future") -> None:
+        with self.lock:
+            super().add_cancelled(future)
+            self.event.set()
+
+
+class _FirstCompletedWaiter(_Waiter):
+    def add_result(self, future: "Future") -> None:
+        super().add_result(future)
+        self.event.set()
+
+    def add_exception(self, future: "Future") -> None:
+        super().add_exception(future)
+        self.event.set()
+
+    def add_cancelled(self, future: "Future") -> None:
+        super().add_cancelled(future)
+        self.event.set()
+
+
+class _AllCompletedWaiter(_Waiter):
+    def __init__(self, num_pending_calls: int, stop_on_exception: bool) -> None:
+        super().__init__()
+        self.num_pending_calls = num_pending_calls
+        self.stop_on_exception = stop_on_exception
+        self.lock = threading.Lock()
+
+    def _decrement_pending_calls(self) -> None:
+        with self.lock:
+            self.num_pending_calls -= 1
+            if not self.num_pending_calls:
+                self.event.set()
+
+    def add_result(self, future: "Future") -> None:
+        super().add_result(future)
+        self._decrement_pending_calls()
+
+    def add_exception(self, future: "Future") -> None:
+        super().add_exception(future)
+        if self.stop_on_exception:
+            self.event.set()
+        else:
+            self._decrement_pending_calls()
+
+    def add_cancelled(self, future: "Future") -> None:
+        super().add_cancelled(future)
+        self._decrement_pending_calls()
+
+
+class _ResultWaiter:
+    __slots__ = ("lock",)
+
+    def __init__(self) -> None:
+        """Wake up a single thread blocked in `Future.result` or `Future.exception`."""
+        self.lock = threading.Lock()
+        self.lock.acquire()
+
+    def add_result(self, future: "Future") -> None:
+        self.lock.release()
+
+    add_exception = add_result
+    add_cancelled = add_result
+
+
+# Futures guard their state with one of these locks, picked by address, instead of owning a
+# Condition each. A waiter lock is only allocated when a thread actually blocks on a future.
+_FUTURE_LOCKS = [threading.Lock() for _ in range(64)]
+
+
+def _lock_of(future: "Future") -> threading.Lock:
+    return _FUTURE_LOCKS[(id(future) >> 4) & 63]
+
+
+class _AcquireFutures:
+    def __init__(self, futures: Iterable["Future"]) -> None:
+        """Acquire the locks of several futures in a stable order to avoid deadlocks."""
+        self.locks = [_FUTURE_LOCKS[i] for i in sorted(set((id(f) >> 4) & 63 for f in futures))]
+
+    def __enter__(self) -> None:
+        for lock in self.locks:
+            lock.acquire()
+
+    def __exit__(self, *args: Any) -> None:
+        for lock in self.locks:
+            lock.release()
+
+
+class Future:
+    # Without __dict__ a future costs a fraction of the memory, which matters for millions of queued tasks
+    __slots__ = ("_state", "_result", "_waiters", "_done_callbacks", "__weakref__")
+
+    def __init__(self) -> None:
+        """Represent the result of an asynchronous computation, compatible with `concurrent.futures.Future`."""
+        self._state = PENDING
+        # The returned value, or the raised exception when the state is _FAILED
+        self._result: Any = None
+        self._waiters: Optional[List[Any]] = None
+        self._done_callbacks: Optional[List[Callable[["Future"], Any]]] = None
+
+    def __repr__(self) -> str:
+        state = self._state
+        if state == _FAILED:
+            return f"<Future at {id(self):#x} state={FINISHED} raised {type(self._result).__name__}>"
+        if state == FINISHED:
+            return f"<Future at {id(self):#x} state={FINISHED} returned {type(self._result).__name__}>"
+        return f"<Future at {id(self):#x} state={state}>"
+
+    def __await__(self) -> Any:
+        """Await the result from asyncio code, the completion is delivered through `call_soon_threadsafe`."""
+        from .asyncio_bridge import wrap_future
+        return wrap_future(self).__await__()
+
+    def _invoke_callbacks(self) -> None:
+        if not self._done_callbacks:
+            return
+        for callback in self._done_callbacks:
+            try:
+                callback(self)
+            except Exception:
+                _logger.exception("Exception calling callback for %r", self)
+
+    def _complete(self, state: str, result: Any) -> None:
+        """Move the future to a done state and wake up its waiters."""
+        with _lock_of(self):
+            if self._state in _DONE_STATES:
+                raise RuntimeError(f"Future in unexpected state: {self._state}")
+            self._result = result
+            self._state = state
+            if self._waiters:
+                for waiter in self._waiters:
+                    if state == FINISHED:
+                        waiter.add_result(self)
+                    else:
+                        waiter.add_exception(self)
+        self._invoke_callbacks()
+
+    def _wait(self, timeout: Optional[float]) -> bool:
+        """Block until the future is done.
+
+        Returns:
+            bool: False if `timeout` expired first.
+        """
+        lock = _lock_of(self)
+        with lock:
+            if self._state in _DONE_STATES:
+                return True
+            waiter = _ResultWaiter()
+            if self._waiters is None:
+                self._waiters = []
+            self._waiters.append(waiter)
+        if waiter.lock.acquire(True, -1 if timeout is None else max(timeout, 0)):
+            return True
+        with lock:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            return self._state in _DONE_STATES
+
+    def cancel(self) -> bool:
+        """Cancel the future if it has not started running.
+
+        Returns:
+            bool: False if the future is already running or finished, True otherwise.
+        """
+        with _lock_of(self):
+            if self._state in (RUNNING, FINISHED, _FAILED):
+                return False
+            if self._state == CANCELLED:
+                return True
+            self._state = CANCELLED
+            if self._waiters:
+                for waiter in self._waiters:
+                    waiter.add_cancelled(self)
+        self._invoke_callbacks()
+        return True
+
+    def cancelled(self) -> bool:
+        """Return True if the future was cancelled."""
+        return self._state == CANCELLED
+
+    def running(self) -> bool:
+        """Return True if the future is currently executing."""
+        return self._state == RUNNING
+
+    def done(self) -> bool:
+        """Return True if the future was cancelled or finished executing."""
+        return self._state in _DONE_STATES
+
+    def add_done_callback(self, fn: Callable[["Future"], Any]) -> None:
+        """Attach a callable that is called with the future when it is cancelled or finishes.
+
+        Args:
+            fn (Callable): The callable, called immediately if the future is already done.
+        """
+        with _lock_of(self):
+            if self._state not in _DONE_STATES:
+                if self._done_callbacks is None:
+                    self._done_callbacks = []
+                self._done_callbacks.append(fn)
+                return
+        try:
+            fn(self)
+        except Exception:
+            _logger.exception("Exception calling callback for %r", self)
+
+    def result(self, timeout: Optional[float] = None) -> Any:
+        """Get the result of the computation, waiting if necessary.
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait. Defaults to None.
+
+        Raises:
+            CancelledError: If the future was cancelled.
+            TimeoutError: If the future did not finish within `timeout`.
+            Exception: The exception raised by the computation.
+
+        Returns:
+            Any: The value returned by the computation.
+        """
+        if self._state not in _DONE_STATES and not self._wait(timeout):
+            raise TimeoutError()
+        state = self._state
+        if state == CANCELLED:
+            raise CancelledError()
+        if state == _FAILED:
+            try:
+                raise self._result
+            finally:
+                # Break the reference cycle between the exception and this frame
+                self = None
+        return self._result
+
+    def exception(self, timeout: Optional[float] = None) -> Optional[BaseException]:
+        """Get the exception raised by the computation, waiting if necessary.
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait. Defaults to None.
+
+        Raises:
+            CancelledError: If the future was cancelled.
+            TimeoutError: If the future did not finish within `timeout`.
+
+        Returns:
+            Optional[BaseException]: The raised exception, or None if the computation succeeded.
+        """
+        if self._state not in _DONE_STATES and not self._wait(timeout):
+            raise TimeoutError()
+        state = self._state
+        if state == CANCELLED:
+            raise CancelledError()
+        return self._result if state == _FAILED else None
+
+    def set_running_or_notify_cancel(self) -> bool:
+        """Mark the future as running, called by the executor before running the computation.
+
+        Returns:
+            bool: False if the future was cancelled and must not run, True otherwise.
+        """
+        with _lock_of(self):
+            if self._state == CANCELLED:
+                return False
+            if self._state == PENDING:
+                self._state = RUNNING
+                return True
+            raise RuntimeError(f"Future in unexpected state: {self._state}")
+
+    def set_result(self, result: Any) -> None:
+        """Set the result of the computation, called by the executor."""
+        self._complete(FINISHED, result)
+
+    def set_exception(self, exception: BaseException) -> None:
+        """Set the exception raised by the computation, called by the executor."""
+        self._complete(_FAILED, exception)
+
+
+def _create_and_install_waiters(fs: Iterable[Future], return_when: str) -> _Waiter:
+    if return_when == _AS_COMPLETED:
+        waiter: _Waiter = _AsCompletedWaiter()
+    elif return_when == FIRST_COMPLETED:
+        waiter = _FirstCompletedWaiter()
+    else:
+        pending_count = sum(f._state not in _DONE_STATES for f in fs)
+        if return_when == FIRST_EXCEPTION:
+            waiter = _AllCompletedWaiter(pending_count, stop_on_exception=True)
+        elif return_when == ALL_COMPLETED:
+            waiter = _AllCompletedWaiter(pending_count, stop_on_exception=False)
+        else:
+            raise ValueError(f"Invalid return condition: {return_when!r}")
+    for f in fs:
+        if f._waiters is None:
+            f._waiters = []
+        f._waiters.append(waiter)
+    return waiter
+
+
+def as_completed(fs: Iterable[Future], timeout: Optional[float] = None) -> Iterator[Future]:
+    """Yield futures as they complete (finished or cancelled).
+
+    Args:
+        fs (Iterable[Future]): The futures to watch, duplicates are yielded once.
+        timeout (float, optional): Maximum seconds to wait for all futures. Defaults to None.
+
+    Raises:
+        TimeoutError: If some futures are still pending after `timeout` seconds.
+
+    Returns:
+        Iterator[Future]: The futures in completion order.
+    """
+    end_time = None if timeout is None else timeout + time.monotonic()
+    fs = set(fs)
+    total_futures = len(fs)
+    with _AcquireFutures(fs):
+        finished = set(f for f in fs if f._state in _DONE_STATES)
+        pending = fs - finished
+        waiter = _create_and_install_waiters(fs, _AS_COMPLETED)
+    finished_list = list(finished)
+    try:
+        while finished_list:
+            yield finished_list.pop()
+
+        while pending:
+            if timeout is None:
+                wait_timeout = None
+            else:
+                wait_timeout = end_time - time.monotonic()
+                if wait_timeout < 0:
+                    raise TimeoutError(f"{len(pending)} (of {total_futures}) futures unfinished")
+
+            waiter.event.wait(wait_timeout)
+
+            with waiter.lock:
+                finished_list = waiter.finished_futures
+                waiter.finished_futures = []
+                waiter.event.clear()
+
+            # Reverse so that futures are yielded in completion order
+            finished_list.reverse()
+            while finished_list:
+                f = finished_list.pop()
+                pending.remove(f)
+                yield f
+    finally:
+        for f in fs:
+            with _lock_of(f):
+                f._waiters.remove(waiter)
+
+
+def wait(fs: Iterable[Future], timeout: Optional[float] = None, return_when: str = ALL_COMPLETED) -> DoneAndNotDoneFutures:
+    """Wait for the futures to complete.
+
+    Args:
+        fs (Iterable[Future]): The futures to wait for.
+        timeout (float, optional): Maximum seconds to wait. Defaults to None.
+        return_when (str, optional): FIRST_COMPLETED, FIRST_EXCEPTION or ALL_COMPLETED. Defaults to ALL_COMPLETED.
+
+    Returns:
+        DoneAndNotDoneFutures: A named 2-tuple of sets, the done futures and the not done futures.
+    """
+    fs = set(fs)
+    with _AcquireFutures(fs):
+        done = set(f for f in fs if f._state in _DONE_STATES)
+        not_done = fs - done
+        if return_when == FIRST_COMPLETED and done:
+            return DoneAndNotDoneFutures(done, not_done)
+        if return_when == FIRST_EXCEPTION and done:
+            if any(f for f in done if f._state == _FAILED):
+                return DoneAndNotDoneFutures(done, not_done)
+        if len(done) == len(fs):
+            return DoneAndNotDoneFutures(done, not_done)
+        waiter = _create_and_install_waiters(fs, return_when)
+
+    waiter.event.wait(timeout)
+    for f in fs:
+        with _lock_of(f):
+            f._waiters.remove(waiter)
+
+    done.update(waiter.finished_futures)
+    return DoneAndNotDoneFutures(done, fs - done)
+
+
+class DeadlineExceededError(TimeoutError):
+    """The task was still queued when its deadline passed, so it was dropped without running."""
+
+
+class Task(Future):
+    __slots__ = ("func", "args", "kwargs", "priority", "deadline", "enqueue_time", "executor", "_in_queue")
+
     def __init__(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> None:
-        """Represent a task to be executed by a worker thread.
+        """Represent a task to be executed by a worker thread, and the future of its result.
 
         Args:
             func (Callable): The function to execute.
             *args: Positional arguments for the function.
             **kwargs: Keyword arguments for the function.
         """
+        Future.__init__(self)
         self.func = func
         self.args = args
         self.kwargs = kwargs
-        self.result = None
-        self.exception = None
-        self.event = threading.Event()
+        self.priority = 0
+        self.deadline: Optional[float] = None
+        self.enqueue_time = 0.0
+        # Set by the executor while the task sits in its shared queue
+        self.executor: Optional["ThreadPoolExecutor"] = None
+        self._in_queue = False
 
     def __repr__(self) -> str:
         return f"Task(func={self.func.__name__}, args={self.args}, kwargs={self.kwargs})"
 
-    def run(self) -> None:
-        """Execute the task's function and store the result or exception."""
+    @property
+    def future(self) -> Future:
+        """The task is its own future, kept for compatibility."""
+        return self
+
+    def cancel(self) -> bool:
+        """Cancel the task if it has not started running, removing it from the executor's queue."""
+        was_pending = self._state == PENDING
+        cancelled = Future.cancel(self)
+        if cancelled and was_pending:
+            executor = self.executor
+            if executor is not None:
+                executor._discard_task(self)
+        return cancelled
+
+    def run(self) -> str:
+        """Execute the task's function and store the result or exception.
+
+        Returns:
+            str: TASK_COMPLETED, TASK_FAILED if the function raised, or TASK_DROPPED if the task
+                was cancelled or missed its deadline.
+        """
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            if self.set_running_or_notify_cancel():
+                self.set_exception(DeadlineExceededError(f"{self!r} missed its deadline"))
+            return TASK_DROPPED
+        if not self.set_running_or_notify_cancel():
+            return TASK_DROPPED
         try:
-            self.result = self.func(*self.args, **self.kwargs)
-        except Exception as e:
-            self.exception = e
-        finally:
-            self.event.set()
+            result = self.func(*self.args, **self.kwargs)
+        except BaseException as e:
+            self.set_exception(e)
+            return TASK_FAILED
+        self.set_result(result)
+        return TASK_COMPLETED
 
     def get_result(self) -> Any:
         """Get the result of the task, waiting if necessary."""
-        self.event.wait()  # Wait for the task to complete
-        if self.exception:
-            raise self.exception
-        return self.result
+        return self.result()
 
 
-class Future:
-    def __init__(self, task: Task) -> None:
-        self.task = task
+class _Histogram:
+    # Bucket i holds durations in [2 ** (i - 1), 2 ** i) microseconds, the last bucket is open-ended
+    _NUM_BUCKETS = 40
+
+    def __init__(self) -> None:
+        """Log2-bucketed histogram of durations in seconds, updated in O(1)."""
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * self._NUM_BUCKETS
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[min(int(seconds * 1000000).bit_length(), self._NUM_BUCKETS - 1)] += 1
+
+    def merge(self, other: "_Histogram") -> None:
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        for i, n in enumerate(other.buckets):
+            self.buckets[i] += n
+
+    def percentile(self, p: float) -> float:
+        """Get an upper bound of the p-th percentile, accurate to a factor of 2."""
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank and n:
+                return min((1 << i) / 1000000, self.max)
+        return self.max
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+        }
+
+
+class _WorkerStats:
+    def __init__(self) -> None:
+        """Counters of a single worker, only written by that worker so updates need no lock."""
+        self.busy = False
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.queue_wait: Dict[int, _Histogram] = {}
+        self.run_time = _Histogram()
+
+    def merge(self, other: "_WorkerStats") -> None:
+        self.completed += other.completed
+        self.failed += other.failed
+        self.dropped += other.dropped
+        # Copy first, the owning worker may add a priority while it is being merged
+        for priority, histogram in list(other.queue_wait.items()):
+            self.queue_wait.setdefault(priority, _Histogram()).merge(histogram)
+        self.run_time.merge(other.run_time)
+
+
+class _PriorityTaskQueue:
+    def __init__(self) -> None:
+        """Heap of tasks ordered by priority, then deadline, then submission order.
+
+        Removal clears the task's `_in_queue` flag in O(1), removed tasks are skipped by `pop` and
+        the heap is compacted once they make up half of it, so every operation is O(log n) amortized.
+        Not thread-safe, the executor guards it with its own lock.
+        """
+        self._heap: List[tuple] = []
+        self._size = 0
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        return self._size
 
-    def result(self) -> Any:
-        """Get the result of the task associated with this Future."""
-        return self.task.get_result()
+    def push(self, task: Task) -> None:
+        deadline = float("inf") if task.deadline is None else task.deadline
+        task._in_queue = True
+        self._size += 1
+        heapq.heappush(self._heap, (task.priority, deadline, next(self._counter), task))
+
+    def pop(self) -> Task:
+        while True:
+            task = heapq.heappop(self._heap)[-1]
+            if task._in_queue:
+                task._in_queue = False
+                self._size -= 1
+                return task
+
+    def remove(self, task: Task) -> bool:
+        if not task._in_queue:
+            return False
+        task._in_queue = False
+        self._size -= 1
+        if len(self._heap) > 2 * self._size + 64:
+            self._heap = [entry for entry in self._heap if entry[-1]._in_queue]
+            heapq.heapify(self._heap)
+        return True
+
+
+def _process_chunk(func: Callable[..., Any], chunk: List[tuple]) -> List[Any]:
+    """Run `func` over a chunk of argument tuples inside a single task."""
+    return [func(*args) for args in chunk]
+
+
+def _chunk_iterable(iterable: Iterator[tuple], chunksize: int) -> Iterator[List[tuple]]:
+    """Split an iterator into lists of at most `chunksize` items."""
+    while True:
+        chunk = list(itertools.islice(iterable, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _lazy_map(submit: Callable[..., Future],
+              func: Callable[..., Any],
+              iterables: tuple,
+              timeout: Optional[float],
+              chunksize: int,
+              prefetch: int) -> Iterator[Any]:
+    """Implement `map` on top of an executor's `submit`, keeping at most `prefetch` tasks in flight."""
+    if chunksize < 1:
+        raise ValueError("chunksize must be >= 1")
+    if prefetch < 1:
+        raise ValueError("prefetch must be >= 1")
+    end_time = None if timeout is None else timeout + time.monotonic()
+
+    args_iter: Iterator[Any] = zip(*iterables)
+    if chunksize > 1:
+        args_iter = _chunk_iterable(args_iter, chunksize)
+
+    def submit_next() -> bool:
+        try:
+            args = next(args_iter)
+        except StopIteration:
+            return False
+        if chunksize > 1:
+            in_flight.append(submit(_process_chunk, func, args))
+        else:
+            in_flight.append(submit(func, *args))
+        return True
+
+    in_flight: Deque[Future] = collections.deque()
+    # Fill the window now, so the work starts before the first result is requested
+    while len(in_flight) < prefetch and submit_next():
+        pass
+
+    def result_iterator() -> Iterator[Any]:
+        try:
+            while in_flight:
+                future = in_flight.popleft()
+                submit_next()
+                if end_time is None:
+                    result = future.result()
+                else:
+                    result = future.result(end_time - time.monotonic())
+                if chunksize > 1:
+                    yield from result
+                else:
+                    yield result
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+    return result_iterator()
 
 
 class ThreadPoolExecutor:
-    def __init__(self, max_workers: int, max_queue_size: int = 0) -> None:
+    def __init__(self,
+                 max_workers: int,
+                 max_queue_size: int = 0,
+                 min_workers: int = 0,
+                 keep_alive: Optional[float] = 60.0,
+                 work_stealing: bool = False,
+                 stats_interval: Optional[float] = None,
+                 stats_callback: Optional[Callable[[Dict[str, Any]], Any]] = None) -> None:
         """Create a thread pool executor.
 
+        Worker threads are spawned lazily when tasks are submitted and sleep on a
+        condition variable while idle, so an idle pool never wakes up to poll.
+
+        With `work_stealing`, every worker owns a local deque that `submit_many` fills in bulk.
+        Workers drain their own deque and then steal from the other workers without taking the
+        pool lock, which suits large batches of fine-grained tasks.
+
         Args:
             max_workers (int): The maximum number of worker threads.
             max_queue_size (int, optional): Maximum size of the task queue. Defaults to 0.
+            min_workers (int, optional): Number of workers that are never retired. Defaults to 0.
+            keep_alive (float, optional): Seconds an idle worker above `min_workers` waits for
+                new tasks before exiting, None keeps idle workers forever. Defaults to 60.0.
+            work_stealing (bool, optional): Schedule `submit_many` batches on per-worker deques. Defaults to False.
+            stats_interval (float, optional): Seconds between two calls of `stats_callback`. Defaults to None.
+            stats_callback (Callable, optional): Called with `get_stats()` every `stats_interval` seconds
+                from a background thread until shutdown. Defaults to None.
         """
+        if max_workers <= 0:
+            raise ValueError("max_workers must be greater than 0")
+        if not 0 <= min_workers <= max_workers:
+            raise ValueError("min_workers must be between 0 and max_workers")
         self.max_workers = max_workers
         self.max_queue_size = max_queue_size
+        self.min_workers = min_workers
+        self.keep_alive = keep_alive
+        self.work_stealing = work_stealing
         self.workers: List[threading.Thread] = []
-        self.task_queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._tasks = _PriorityTaskQueue()
+        self._local_queues: List[Deque[Task]] = []
+        self._worker_stats: List[_WorkerStats] = []
+        # Counters of the retired workers
+        self._retired_stats = _WorkerStats()
+        self._submitted_tasks = 0
+        self._unfinished_tasks = 0
+        # Workers waiting for a task, including the ones that have been spawned but not started yet
+        self._idle_workers = 0
         self._shutdown = False
         self._shutdown_lock = threading.Lock()
+        # All conditions share the same lock, so the queue and the worker bookkeeping stay consistent
+        self._not_empty = threading.Condition(self._shutdown_lock)
+        self._not_full = threading.Condition(self._shutdown_lock)
+        self._all_tasks_done = threading.Condition(self._shutdown_lock)
+        self._stats_stop = threading.Event()
+        if stats_callback is not None:
+            if not stats_interval or stats_interval <= 0:
+                raise ValueError("stats_interval must be greater than 0 when stats_callback is set")
+            reporter = threading.Thread(target=self._report_stats, args=(stats_interval, stats_callback), daemon=True)
+            reporter.start()
 
-    def _worker(self) -> None:
-        """Worker function for processing tasks."""
-        while not self._shutdown:
-            try:
-                task = self.task_queue.get(timeout=0.1)
-            except queue.Empty:
-                continue
-            if task is None:
-                break
+    def _worker(self, local: Deque[Task], stats: _WorkerStats) -> None:
+        """Worker function for processing tasks.
+
+        Args:
+            local (Deque[Task]): The worker's own deque, only used in work stealing mode.
+            stats (_WorkerStats): The worker's own counters.
+        """
+        current = threading.current_thread()
+        with self._shutdown_lock:
+            self._idle_workers -= 1
             try:
-                task.run()
-            except Exception as e:
-                # Optionally, you can log or handle the exception here
-                pass
-            self.task_queue.task_done()
+                while True:
+                    if len(self.workers) > self.max_workers:
+                        break
+                    if self._tasks:
+                        task: Optional[Task] = self._pop_shared_task()
+                    elif self.work_stealing:
+                        task = self._take_local_task(local)
+                    else:
+                        task = None
+                    if task is None:
+                        if self._shutdown:
+                            break
+                        # Workers above min_workers wait at most keep_alive seconds, the others sleep until notified
+                        timeout = self.keep_alive if len(self.workers) > self.min_workers else None
+                        self._idle_workers += 1
+                        try:
+                            notified = self._not_empty.wait(timeout)
+                        finally:
+                            self._idle_workers -= 1
+                        if (not notified and not self._tasks and not any(self._local_queues)
+                                and len(self.workers) > self.min_workers):
+                            break
+                        continue
+
+                    self._shutdown_lock.release()
+                    finished = 0
+                    stats.busy = True
+                    try:
+                        while task is not None:
+                            self._run_task(task, stats)
+                            finished += 1
+                            # Keep draining the deques without the lock, unless prioritized shared tasks are waiting
+                            task = self._take_local_task(local) if self.work_stealing and not self._tasks else None
+                    finally:
+                        stats.busy = False
+                        self._shutdown_lock.acquire()
+
+                    self._unfinished_tasks -= finished
+                    if self.work_stealing and self.max_queue_size > 0:
+                        self._not_full.notify_all()
+                    if self._unfinished_tasks == 0:
+                        self._all_tasks_done.notify_all()
+            finally:
+                self.workers.remove(current)
+                self._worker_stats.remove(stats)
+                self._retired_stats.merge(stats)
+                if self.work_stealing:
+                    self._local_queues.remove(local)
+                    self._hand_off_local_tasks(local)
+
+    @staticmethod
+    def _run_task(task: Task, stats: _WorkerStats) -> None:
+        """Run a task and record its queue wait and run time in the worker's counters."""
+        start = time.monotonic()
+        queue_wait = stats.queue_wait.get(task.priority)
+        if queue_wait is None:
+            queue_wait = stats.queue_wait[task.priority] = _Histogram()
+        queue_wait.add(start - task.enqueue_time)
+        try:
+            outcome = task.run()
+        except Exception as e:
+            # Optionally, you can log or handle the exception here
+            outcome = TASK_FAILED
+        if outcome == TASK_DROPPED:
+            stats.dropped += 1
+            return
+        if outcome == TASK_COMPLETED:
+            stats.completed += 1
+        else:
+            stats.failed += 1
+        stats.run_time.add(time.monotonic() - start)
+
+    def _pop_shared_task(self) -> Task:
+        """Pop the next task from the shared queue. Must be called with `_shutdown_lock` held."""
+        task = self._tasks.pop()
+        task.executor = None
+        if self.max_queue_size > 0:
+            self._not_full.notify()
+        return task
+
+    def _take_local_task(self, local: Deque[Task]) -> Optional[Task]:
+        """Take a task from the worker's own deque, or steal one from another worker.
+
+        Deque operations are atomic, so this does not need `_shutdown_lock`. The owner takes
+        from the left end and thieves from the right end to limit contention.
+        """
+        try:
+            return local.popleft()
+        except IndexError:
+            pass
+        queues = self._local_queues
+        count = len(queues)
+        if count > 1:
+            start = random.randrange(count)
+            for i in range(count):
+                try:
+                    victim = queues[(start + i) % count]
+                    if victim is not local:
+                        return victim.pop()
+                except IndexError:
+                    # Either the victim is empty or a retiring worker shrank the list
+                    continue
+        return None
+
+    def _hand_off_local_tasks(self, local: Deque[Task]) -> None:
+        """Move the tasks left in a retiring worker's deque. Must be called with `_shutdown_lock` held."""
+        if not local:
+            return
+        if self._local_queues:
+            self._local_queues[0].extend(local)
+        else:
+            for task in local:
+                task.executor = self
+                self._tasks.push(task)
+        local.clear()
+        self._spawn_workers_for_backlog()
+        self._not_empty.notify_all()
+
+    def _spawn_worker(self) -> None:
+        """Start a new worker thread. Must be called with `_shutdown_lock` held."""
+        local: Deque[Task] = collections.deque()
+        stats = _WorkerStats()
+        worker = threading.Thread(target=self._worker, args=(local, stats))
+        self.workers.append(worker)
+        self._worker_stats.append(stats)
+        if self.work_stealing:
+            self._local_queues.append(local)
+        self._idle_workers += 1
+        worker.start()
+
+    def _spawn_workers_for_backlog(self, backlog: int = 0) -> None:
+        """Spawn workers for queued tasks that no idle worker can take. Must be called with `_shutdown_lock` held.
+
+        Args:
+            backlog (int, optional): Tasks about to be queued, in addition to the queued ones. Defaults to 0.
+        """
+        backlog += len(self._tasks)
+        while backlog > self._idle_workers and len(self.workers) < self.max_workers:
+            self._spawn_worker()
+
+    def _submit(self, task: Task) -> Task:
+        """Queue a task. Must be called with `_shutdown_lock` held.
+
+        Args:
+            task (Task): The task to queue.
+
+        Returns:
+            Task: The queued task.
+        """
+        if self.max_queue_size > 0:
+            while len(self._tasks) >= self.max_queue_size:
+                self._not_full.wait()
+                if self._shutdown:
+                    raise RuntimeError("Cannot submit after shutdown")
+        task.executor = self
+        task.enqueue_time = time.monotonic()
+        self._tasks.push(task)
+        self._unfinished_tasks += 1
+        self._submitted_tasks += 1
+        self._spawn_workers_for_backlog()
+        self._not_empty.notify()
+        return task
+
+    def _discard_task(self, task: Task) -> None:
+        """Remove a cancelled task from the queue."""
+        with self._shutdown_lock:
+            if not self._tasks.remove(task):
+                return
+            task.executor = None
+            if self.max_queue_size > 0:
+                self._not_full.notify()
+            self._unfinished_tasks -= 1
+            if self._unfinished_tasks == 0:
+                self._all_tasks_done.notify_all()
+
+    def submit(self,
+               func: Callable[..., Any],
+               *args: Any,
+               priority: int = 0,
+               deadline: Optional[float] = None,
+               **kwargs: Any) -> Future:
+        """Submit a task to the thread pool and return a Future object.
 
-    def _submit(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Task:
-        """Submit a task to the thread pool.
+        Queued tasks run in order of `priority`, then `deadline`, then submission. A task whose
+        deadline has passed before a worker picks it up is dropped and its future raises
+        DeadlineExceededError. Cancelling the future of a queued task removes it from the queue.
 
         Args:
             func (Callable): The function to execute.
             *args: Positional arguments for the function.
+            priority (int, optional): Lower values run first. Defaults to 0.
+            deadline (float, optional): Latest `time.monotonic()` time the task may start at. Defaults to None.
             **kwargs: Keyword arguments for the function.
 
         Returns:
-            Task: The task object representing the submitted task.
+            Future: A Future object representing the task's result.
         """
+        if not callable(func):
+            raise TypeError("func must be a callable function")
         task = Task(func, *args, **kwargs)
-        self.task_queue.put(task)
-        return task
+        task.priority = priority
+        task.deadline = deadline
+        with self._shutdown_lock:
+            if self._shutdown:
+                raise RuntimeError("Cannot submit after shutdown")
+            self._submit(task)
+            return task
 
-    def submit(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
-        """Submit a task to the thread pool and return a Future object.
+    async def run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run a task in the pool and await its result from asyncio code.
 
         Args:
             func (Callable): The function to execute.
@@ -103,35 +978,174 @@ class ThreadPoolExecutor:
             **kwargs: Keyword arguments for the function.
 
         Returns:
-            Future: A Future object representing the task's result.
+            Any: The value returned by the function.
+        """
+        return await self.submit(func, *args, **kwargs)
+
+    def submit_many(self,
+                    func: Callable[..., Any],
+                    iterable: Iterable[Any],
+                    priority: int = 0,
+                    deadline: Optional[float] = None) -> List[Future]:
+        """Submit `func(item)` for every item with a single acquisition of the pool lock.
+
+        In work stealing mode the batch is split across the workers' deques and `priority` must be 0.
+        With `max_queue_size` the batch is queued in chunks as space frees up. If the pool is shut down
+        while waiting for space, the tasks already queued still run and the rest are returned cancelled.
+
+        Args:
+            func (Callable): The function to execute.
+            iterable (Iterable): Items passed to `func`, one per task.
+            priority (int, optional): Lower values run first. Defaults to 0.
+            deadline (float, optional): Latest `time.monotonic()` time the tasks may start at. Defaults to None.
+
+        Returns:
+            List[Future]: The futures of the tasks, in the order of the items.
+
+        Raises:
+            RuntimeError: If the pool was shut down before any task of the batch was queued.
         """
         if not callable(func):
             raise TypeError("func must be a callable function")
+        if self.work_stealing and priority != 0:
+            raise ValueError("priority is not supported by submit_many in work stealing mode")
+        tasks = [Task(func, item) for item in iterable]
+        if deadline is not None or priority != 0:
+            for task in tasks:
+                task.priority = priority
+                task.deadline = deadline
+        if not tasks:
+            return []
+
         with self._shutdown_lock:
             if self._shutdown:
                 raise RuntimeError("Cannot submit after shutdown")
-            task = self._submit(func, *args, **kwargs)
-            return Future(task)
+            if self.work_stealing:
+                self._submit_to_local_queues(tasks)
+            else:
+                self._submit_to_shared_queue(tasks)
+        return tasks
+
+    def _submit_to_shared_queue(self, tasks: List[Task]) -> None:
+        """Queue a batch on the shared queue. Must be called with `_shutdown_lock` held."""
+        position = 0
+        while position < len(tasks):
+            if self.max_queue_size > 0:
+                while len(self._tasks) >= self.max_queue_size:
+                    self._not_full.wait()
+                    if self._shutdown:
+                        self._abort_batch(tasks, position)
+                        return
+                end = position + self.max_queue_size - len(self._tasks)
+            else:
+                end = len(tasks)
+            now = time.monotonic()
+            for task in tasks[position:end]:
+                task.executor = self
+                task.enqueue_time = now
+                self._tasks.push(task)
+            self._unfinished_tasks += len(tasks[position:end])
+            self._submitted_tasks += len(tasks[position:end])
+            position = end
+            self._spawn_workers_for_backlog()
+            self._not_empty.notify(len(self._tasks))
+
+    def _submit_to_local_queues(self, tasks: List[Task]) -> None:
+        """Split a batch across the workers' deques. Must be called with `_shutdown_lock` held."""
+        position = 0
+        while position < len(tasks):
+            if self.max_queue_size > 0:
+                # Deque lengths are not tracked, the unfinished count bounds the queued tasks instead
+                while self._unfinished_tasks >= self.max_queue_size + len(self.workers):
+                    self._not_full.wait()
+                    if self._shutdown:
+                        self._abort_batch(tasks, position)
+                        return
+                end = position + self.max_queue_size + len(self.workers) - self._unfinished_tasks
+            else:
+                end = len(tasks)
+            chunk = tasks[position:end]
+            position = end
+            self._spawn_workers_for_backlog(len(chunk))
+            now = time.monotonic()
+            for task in chunk:
+                task.enqueue_time = now
+            queues = self._local_queues
+            chunk_size = -(-len(chunk) // len(queues))
+            for i, queue in enumerate(queues):
+                queue.extend(chunk[i * chunk_size:(i + 1) * chunk_size])
+            self._unfinished_tasks += len(chunk)
+            self._submitted_tasks += len(chunk)
+            self._not_empty.notify(len(chunk))
+
+    @staticmethod
+    def _abort_batch(tasks: List[Task], position: int) -> None:
+        """Handle a shutdown in the middle of a batch whose first `position` tasks are already queued."""
+        if position == 0:
+            raise RuntimeError("Cannot submit after shutdown")
+        # The queued tasks still run on shutdown, the caller gets cancelled futures for the others
+        for task in tasks[position:]:
+            task.cancel()
+
+    def map(self,
+            func: Callable[..., Any],
+            *iterables: Iterable[Any],
+            timeout: Optional[float] = None,
+            chunksize: int = 1,
+            prefetch: Optional[int] = None) -> Iterator[Any]:
+        """Return an iterator equivalent to map(func, *iterables), executed by the pool.
+
+        Input is consumed lazily: at most `prefetch` tasks are queued at any time and a new
+        task is submitted each time a result is taken from the iterator.
+
+        Args:
+            func (Callable): The function to execute.
+            *iterables: Iterables yielding the arguments for `func`.
+            timeout (float, optional): Maximum seconds to wait, counted from the call to map. Defaults to None.
+            chunksize (int, optional): Number of items handed to a worker as a single task. Defaults to 1.
+            prefetch (int, optional): Number of tasks kept in flight. Defaults to twice max_workers.
+
+        Raises:
+            TimeoutError: If a result is not available within `timeout`.
+
+        Returns:
+            Iterator[Any]: The results, in the order of the input.
+        """
+        if prefetch is None:
+            prefetch = 2 * self.max_workers
+        return _lazy_map(self.submit, func, iterables, timeout, chunksize, prefetch)
 
     def start(self) -> None:
-        """Start the worker threads."""
-        for _ in range(self.max_workers):
-            worker = threading.Thread(target=self._worker)
-            worker.start()
-            self.workers.append(worker)
+        """Pre-start the `min_workers` core threads, other workers are spawned on demand."""
+        with self._shutdown_lock:
+            while len(self.workers) < self.min_workers:
+                self._spawn_worker()
 
     def wait_completion(self) -> None:
         """Wait for all tasks to complete."""
-        self.task_queue.join()
+        with self._all_tasks_done:
+            while self._unfinished_tasks:
+                self._all_tasks_done.wait()
 
-    def shutdown(self) -> None:
-        """Gracefully shut down the thread pool."""
+    def shutdown(self, wait: bool = False) -> None:
+        """Gracefully shut down the thread pool.
+
+        Queued tasks are still executed, then the workers exit.
+
+        Args:
+            wait (bool, optional): Block until all worker threads have exited. Defaults to False.
+        """
         with self._shutdown_lock:
-            if self._shutdown:
-                return
-            for _ in range(self.max_workers):
-                self.task_queue.put(None)
-            self._shutdown = True
+            if not self._shutdown:
+                self._shutdown = True
+                self._stats_stop.set()
+                self._not_empty.notify_all()
+                self._not_full.notify_all()
+            workers = list(self.workers)
+        if wait:
+            for worker in workers:
+                if worker is not threading.current_thread():
+                    worker.join()
 
     def __enter__(self) -> "ThreadPoolExecutor":
         self.start()
@@ -143,13 +1157,82 @@ class ThreadPoolExecutor:
     def set_max_workers(self, max_workers: int) -> None:
         """Set the maximum number of worker threads.
 
+        Growing the pool immediately spawns workers for queued tasks, shrinking it retires
+        idle workers at once and busy workers after their current task.
+
         Args:
             max_workers (int): The new maximum number of worker threads.
         """
+        if max_workers <= 0:
+            raise ValueError("max_workers must be greater than 0")
         with self._shutdown_lock:
             if self._shutdown:
                 raise RuntimeError("Cannot set_max_workers after shutdown")
             self.max_workers = max_workers
+            self.min_workers = min(self.min_workers, max_workers)
+            if len(self.workers) > max_workers:
+                self._not_empty.notify_all()
+            else:
+                self._spawn_workers_for_backlog()
+
+    def _collect_stats(self) -> _WorkerStats:
+        """Merge the counters of all workers. Must be called with `_shutdown_lock` held."""
+        total = _WorkerStats()
+        total.merge(self._retired_stats)
+        for stats in self._worker_stats:
+            total.merge(stats)
+        return total
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get a snapshot of the pool's utilization and task statistics.
+
+        Workers update their own counters without locking, the snapshot merges them.
+
+        Returns:
+            Dict[str, Any]: The worker counts (workers, busy_workers, idle_workers, max_workers),
+                queue_depth, the submitted/completed/failed/dropped task counters, and the
+                queue_wait and run_time histogram summaries (count, mean, max, p50, p90, p99 in seconds).
+        """
+        with self._shutdown_lock:
+            total = self._collect_stats()
+            busy = sum(stats.busy for stats in self._worker_stats)
+            workers = len(self.workers)
+            queue_depth = len(self._tasks) + sum(len(queue) for queue in self._local_queues)
+            submitted = self._submitted_tasks
+        queue_wait = _Histogram()
+        for histogram in total.queue_wait.values():
+            queue_wait.merge(histogram)
+        return {
+            "workers": workers,
+            "busy_workers": busy,
+            "idle_workers": workers - busy,
+            "max_workers": self.max_workers,
+            "queue_depth": queue_depth,
+            "submitted": submitted,
+            "completed": total.completed,
+            "failed": total.failed,
+            "dropped": total.dropped,
+            "queue_wait": queue_wait.snapshot(),
+            "run_time": total.run_time.snapshot(),
+        }
+
+    def get_queue_wait_stats(self) -> Dict[int, Dict[str, float]]:
+        """Get queue wait time statistics of the started tasks, per priority.
+
+        Returns:
+            Dict[int, Dict[str, float]]: For each priority, the count, mean, max, p50, p90 and p99 wait in seconds.
+        """
+        with self._shutdown_lock:
+            total = self._collect_stats()
+        return {priority: histogram.snapshot() for priority, histogram in sorted(total.queue_wait.items())}
+
+    def _report_stats(self, interval: float, callback: Callable[[Dict[str, Any]], Any]) -> None:
+        """Stats reporter thread, calls `callback` with a snapshot every `interval` seconds until shutdown."""
+        while not self._stats_stop.wait(interval):
+            try:
+                callback(self.get_stats())
+            except Exception:
+                _logger.exception("Exception calling stats callback %r", callback)
 
     def get_idle_thread_count(self) -> int:
         """Get the count of idle worker threads.
@@ -157,7 +1240,8 @@ class ThreadPoolExecutor:
         Returns:
             int: The count of idle worker threads.
         """
-        return len(self.workers) - self.task_queue.qsize()
+        with self._shutdown_lock:
+            return len(self.workers) - sum(stats.busy for stats in self._worker_stats)
 
 
 if __name__ == "__main__":
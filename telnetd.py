@@ -1,77 +1,848 @@
 from simple_logger import SimpleLogger
 
+import errno
+import fcntl
+import json
 import logging
 import pty
+import signal
 import socket
 import os
-import select
+import selectors
+import struct
 import subprocess
-from concurrent.futures import ThreadPoolExecutor
+import termios
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+
+# Adaptive pty read size bounds: grow while reads fill the buffer, shrink back for interactive output
+_READ_MIN = 4096
+_READ_MAX = 64 * 1024
+# Seconds a hung up shell gets to exit before it is killed
+_HANGUP_GRACE = 1.0
+
+
+def _events_of(readable: bool, writable: bool) -> int:
+    return (selectors.EVENT_READ if readable else 0) | (selectors.EVENT_WRITE if writable else 0)
+
+
+class _Shell:
+    def __init__(self):
+        """A shell running on a fresh pty, owned by a session or waiting in the pool."""
+        master_fd, slave_fd = pty.openpty()
+        try:
+            self.process = subprocess.Popen(['/bin/bash'], stdin=slave_fd, stdout=slave_fd, stderr=slave_fd,
+                                            start_new_session=True)
+        except BaseException:
+            os.close(master_fd)
+            raise
+        finally:
+            os.close(slave_fd)
+        self.master_fd = master_fd
+        os.set_blocking(master_fd, False)
+        self.created = time.monotonic()
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def hangup(self):
+        """Close the pty and send SIGHUP to the shell's session, the caller reaps the process."""
+        os.close(self.master_fd)
+        # The number may be reused by the next pty at once, nothing may touch it any more
+        self.master_fd = -1
+        try:
+            os.killpg(self.process.pid, signal.SIGHUP)
+        except ProcessLookupError:
+            pass
+
+
+class _ShellPool:
+    def __init__(self, size: int, max_idle: Optional[float], headroom: Callable[[], int], logger):
+        """Shells spawned ahead of time by a background thread so a new session starts at a prompt.
+
+        Args:
+            size (int): Number of idle shells to keep ready.
+            max_idle (float, optional): Seconds after which an idle shell is replaced, None keeps it forever.
+            headroom (Callable[[], int]): Returns how many more sessions the server accepts, the pool
+                never holds more idle shells than that.
+            logger (logging.Logger): Logger for spawn errors.
+        """
+        self.size = size
+        self.max_idle = max_idle
+        self.headroom = headroom
+        self.logger = logger
+        self._idle: Deque[_Shell] = deque()
+        self._changed = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="telnetd-shell-pool", daemon=True)
+
+    def __len__(self):
+        return len(self._idle)
+
+    def start(self):
+        self._thread.start()
+
+    def take(self) -> Optional[_Shell]:
+        """Return a live idle shell, or None if the pool is empty."""
+        with self._changed:
+            while self._idle:
+                # Oldest first, it has had the most time to print its prompt
+                shell = self._idle.popleft()
+                if shell.alive():
+                    self._changed.notify()
+                    return shell
+                shell.hangup()
+            self._changed.notify()
+            return None
+
+    def _run(self):
+        check_interval = min(self.max_idle or 5.0, 5.0)
+        while True:
+            with self._changed:
+                if self._closed:
+                    return
+                expired = self._expired()
+                missing = min(self.size, self.headroom()) - len(self._idle)
+                if not expired and missing <= 0:
+                    self._changed.wait(check_interval)
+                    continue
+            self._retire(expired)
+            if missing > 0:
+                try:
+                    shell = _Shell()
+                except OSError as e:
+                    self.logger.error(f"Error spawning pooled shell: {e}")
+                    with self._changed:
+                        self._changed.wait(check_interval)
+                    continue
+                with self._changed:
+                    closed = self._closed
+                    if not closed:
+                        self._idle.append(shell)
+                if closed:
+                    self._retire([shell])
+
+    def _expired(self) -> List[_Shell]:
+        # Health check under the lock: drop shells that exited or sat idle too long
+        now = time.monotonic()
+        expired = [shell for shell in self._idle
+                   if not shell.alive() or (self.max_idle is not None and now - shell.created > self.max_idle)]
+        for shell in expired:
+            self._idle.remove(shell)
+        return expired
+
+    @staticmethod
+    def _retire(shells: List[_Shell]):
+        """Hang up shells and reap them, killing those still running after the same grace period as sessions."""
+        for shell in shells:
+            shell.hangup()
+        deadline = time.monotonic() + _HANGUP_GRACE
+        for shell in shells:
+            try:
+                shell.process.wait(timeout=max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                try:
+                    os.killpg(shell.process.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                shell.process.wait()
+
+    def close(self):
+        with self._changed:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._changed.notify_all()
+        if self._thread.is_alive():
+            self._thread.join()
+        self._retire(idle)
+
+
+# Telnet commands (RFC 854) and the options this server negotiates
+IAC = 255
+DONT = 254
+DO = 253
+WONT = 252
+WILL = 251
+SB = 250
+SE = 240
+OPT_ECHO = 1
+OPT_SGA = 3
+OPT_NAWS = 31
+OPT_COMPRESS2 = 86
+
+# Longest subnegotiation kept, longer ones are not ours and are discarded
+_SB_MAX = 64
+
+
+class _TelnetProtocol:
+    def __init__(self, compression: bool):
+        """Incremental telnet parser for the client-to-server stream, with option negotiation.
+
+        The server echoes through the pty and runs in character mode (WILL ECHO, WILL SGA), asks for
+        the window size (DO NAWS) and offers MCCP2 compression (WILL COMPRESS2) when enabled.
+
+        Args:
+            compression (bool): Whether to offer MCCP2 compression of the server-to-client stream.
+        """
+        self.local_supported = {OPT_ECHO, OPT_SGA} | ({OPT_COMPRESS2} if compression else set())
+        self.remote_supported = {OPT_NAWS}
+        self.local_enabled = set()
+        self.remote_enabled = set()
+        # Options we asked for and the client has not answered yet
+        self._local_pending = set(self.local_supported)
+        self._remote_pending = set(self.remote_supported)
+        # Commands to send to the client, and events for the session: ("naws", cols, rows) or ("compress",)
+        self.replies = bytearray()
+        self.events = []
+        self._state = self._data
+        self._verb = 0
+        self._sb = bytearray()
+        self._cr = False
+
+        for opt in sorted(self.local_supported):
+            self.replies += bytes((IAC, WILL, opt))
+        for opt in sorted(self.remote_supported):
+            self.replies += bytes((IAC, DO, opt))
+
+    def feed(self, data: bytes) -> bytes:
+        """Parse bytes received from the client and return the plain data for the pty."""
+        out = bytearray()
+        # Bound methods are created on every access, so compare with == rather than is
+        if self._state == self._data and not self._cr and IAC not in data and 13 not in data:
+            return data
+        for byte in data:
+            self._state(byte, out)
+        return bytes(out)
+
+    def _data(self, byte: int, out: bytearray):
+        if byte == IAC:
+            self._state = self._command
+            return
+        if self._cr:
+            self._cr = False
+            # Telnet sends Enter as CR LF or CR NUL, the pty only wants the CR
+            if byte in (0, 10):
+                return
+        self._cr = byte == 13
+        out.append(byte)
+
+    def _command(self, byte: int, out: bytearray):
+        if byte == IAC:
+            self._state = self._data
+            out.append(IAC)
+        elif byte in (WILL, WONT, DO, DONT):
+            self._verb = byte
+            self._state = self._option
+        elif byte == SB:
+            self._sb.clear()
+            self._state = self._subnegotiation
+        else:
+            # NOP, GA, AYT and friends carry nothing for a pty session
+            self._state = self._data
+
+    def _option(self, byte: int, out: bytearray):
+        self._state = self._data
+        verb, opt = self._verb, byte
+        if verb == DO:
+            if opt in self.local_enabled:
+                return
+            if opt not in self.local_supported:
+                self.replies += bytes((IAC, WONT, opt))
+                return
+            self.local_enabled.add(opt)
+            if opt in self._local_pending:
+                self._local_pending.discard(opt)
+            else:
+                self.replies += bytes((IAC, WILL, opt))
+            if opt == OPT_COMPRESS2:
+                self.events.append(("compress",))
+        elif verb == DONT:
+            self._local_pending.discard(opt)
+            if opt in self.local_enabled and opt != OPT_COMPRESS2:
+                # A started zlib stream cannot be taken back, compression only ends with the session
+                self.local_enabled.discard(opt)
+                self.replies += bytes((IAC, WONT, opt))
+        elif verb == WILL:
+            if opt in self.remote_enabled:
+                return
+            if opt not in self.remote_supported:
+                self.replies += bytes((IAC, DONT, opt))
+                return
+            self.remote_enabled.add(opt)
+            if opt in self._remote_pending:
+                self._remote_pending.discard(opt)
+            else:
+                self.replies += bytes((IAC, DO, opt))
+        else:
+            self._remote_pending.discard(opt)
+            if opt in self.remote_enabled:
+                self.remote_enabled.discard(opt)
+                self.replies += bytes((IAC, DONT, opt))
+
+    def _subnegotiation(self, byte: int, out: bytearray):
+        if byte == IAC:
+            self._state = self._subnegotiation_iac
+        elif len(self._sb) < _SB_MAX:
+            self._sb.append(byte)
+
+    def _subnegotiation_iac(self, byte: int, out: bytearray):
+        if byte == IAC:
+            self._state = self._subnegotiation
+            if len(self._sb) < _SB_MAX:
+                self._sb.append(IAC)
+            return
+        self._state = self._data
+        if byte != SE:
+            return
+        if len(self._sb) == 5 and self._sb[0] == OPT_NAWS:
+            cols, rows = struct.unpack(">HH", self._sb[1:])
+            self.events.append(("naws", cols, rows))
+
+
+class _Session:
+    def __init__(self, server: "TelnetServer", client_socket: socket.socket, client_address, shell: _Shell,
+                 accepted_at: float):
+        """One client connection and its shell, driven by the server's selector."""
+        self.server = server
+        self.client_socket = client_socket
+        self.client_address = client_address
+        self.shell = shell
+        self.master_fd = shell.master_fd
+        self.closed = False
+        # Set once the shell exited: the time by which the remaining output must have been sent
+        self.draining_until: Optional[float] = None
+        self._shell_released = False
+        # Shell output the client socket has not accepted yet, and client input the pty has not accepted yet
+        self.output = bytearray()
+        self.input = bytearray()
+        self.read_size = _READ_MIN
+        # Events currently registered for each fd, 0 when unregistered
+        self._socket_events = 0
+        self._pty_events = 0
+        self.telnet = _TelnetProtocol(server.compression)
+        # MCCP2 compressor, created once the client accepts compression
+        self.compressor = None
+        # The compressor holds data that has not been flushed to self.output yet
+        self._compress_pending = False
+        # Counters: bytes on the wire in each direction and shell output before telnet encoding
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.shell_bytes_out = 0
+        self.accepted_at = accepted_at
+        # Seconds from accept until the session had a shell (accept-to-shell latency, time spent in the
+        # listen backlog is not included), and until the client got its first output
+        self.queue_time = time.monotonic() - accepted_at
+        self.first_output_time: Optional[float] = None
+
+        client_socket.setblocking(False)
+        # Output is coalesced before sending, so Nagle would only delay echoes
+        client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        self.send_telnet_replies()
+        if not self.closed:
+            self.update_events()
+
+    def on_client_event(self, mask: int):
+        # The mask comes from the selector batch and may predate the drain, which dropped client input
+        if mask & selectors.EVENT_READ and not self._shell_released:
+            try:
+                data = self.client_socket.recv(_READ_MAX)
+            except (BlockingIOError, InterruptedError):
+                data = None
+            except OSError:
+                data = b""
+            if data == b"":
+                # Client closed the connection
+                self.close()
+                return
+            if data:
+                self.bytes_in += len(data)
+                self.input += self.telnet.feed(data)
+                self.handle_telnet_events()
+                self.flush_input()
+        if mask & selectors.EVENT_WRITE and not self.closed:
+            self.flush_output()
+        if not self.closed:
+            self.update_events()
+
+    def on_pty_event(self, mask: int):
+        if self._shell_released:
+            # An event of the same selector batch that released the shell
+            return
+        if mask & selectors.EVENT_READ:
+            self.read_pty()
+        if mask & selectors.EVENT_WRITE and not self.closed:
+            self.flush_input()
+        if not self.closed:
+            self.update_events()
+
+    def read_pty(self):
+        # Drain what the shell has written so far into one send instead of one send per read
+        limit = self.server.output_buffer_size
+        while len(self.output) < limit:
+            try:
+                output = os.read(self.master_fd, self.read_size)
+            except BlockingIOError:
+                break
+            except OSError:
+                # EIO: the shell exited and the slave side is closed
+                output = b""
+            if not output:
+                self.drain()
+                return
+            self.shell_bytes_out += len(output)
+            self.queue_output(output.replace(b"\xff", b"\xff\xff"))
+            if len(output) == self.read_size:
+                self.read_size = min(self.read_size * 2, _READ_MAX)
+            elif len(output) < self.read_size // 2:
+                self.read_size = max(self.read_size // 2, _READ_MIN)
+        self.flush_output()
+
+    def flush_input(self):
+        if not self.input:
+            return
+        if self._shell_released:
+            # The pty is closed and its fd number may already belong to another session's shell
+            self.input.clear()
+            return
+        try:
+            written = os.write(self.master_fd, self.input)
+        except BlockingIOError:
+            # The shell is not reading its input, keep it until the pty is writable
+            return
+        except OSError:
+            self.close()
+            return
+        del self.input[:written]
+
+    def handle_telnet_events(self):
+        for event in self.telnet.events:
+            if event[0] == "naws":
+                self.set_window_size(*event[1:])
+            elif event[0] == "compress":
+                self.send_telnet_replies()
+                self.output += bytes((IAC, SB, OPT_COMPRESS2, IAC, SE))
+                # Everything after the subnegotiation is one zlib stream
+                self.compressor = zlib.compressobj(self.server.compress_level)
+        self.telnet.events.clear()
+        self.send_telnet_replies()
+
+    def send_telnet_replies(self):
+        if self.telnet.replies:
+            self.queue_output(bytes(self.telnet.replies))
+            self.telnet.replies.clear()
+            self.flush_output()
+
+    def set_window_size(self, cols: int, rows: int):
+        if not cols or not rows:
+            return
+        try:
+            # The kernel signals SIGWINCH to the pty's foreground process group
+            fcntl.ioctl(self.master_fd, termios.TIOCSWINSZ, struct.pack("HHHH", rows, cols, 0, 0))
+        except OSError:
+            pass
+
+    def queue_output(self, data: bytes):
+        """Append telnet-encoded data for the client, compressing it once MCCP2 is active."""
+        if self.compressor is None:
+            self.output += data
+        else:
+            self.output += self.compressor.compress(data)
+            self._compress_pending = True
+
+    def flush_output(self):
+        self._send()
+        # Flush the zlib stream only once the socket has caught up: interactive output goes out at
+        # once, while output piling up behind a slow link keeps compressing into larger blocks
+        if self._compress_pending and not self.output and not self.closed:
+            self.output += self.compressor.flush(self.server.compress_flush)
+            self._compress_pending = False
+            self._send()
+
+    def _send(self):
+        if not self.output:
+            return
+        try:
+            sent = self.client_socket.send(self.output)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            self.close()
+            return
+        del self.output[:sent]
+        self.bytes_out += sent
+        if self.first_output_time is None and self.shell_bytes_out:
+            self.first_output_time = time.monotonic() - self.accepted_at
+
+    def stats(self) -> dict:
+        return {
+            "address": "%s:%s" % self.client_address[:2],
+            "duration": time.monotonic() - self.accepted_at,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "shell_bytes_out": self.shell_bytes_out,
+            "buffered_output": len(self.output),
+            "queue_time": self.queue_time,
+            "first_output_time": self.first_output_time,
+        }
+
+    def drain(self):
+        """Release the exited shell and close once the client has all remaining output, or the drain timeout passed."""
+        if self.compressor is not None:
+            self.output += self.compressor.flush(zlib.Z_FINISH)
+            self.compressor = None
+            self._compress_pending = False
+        self._pty_events = self._set_events(self.master_fd, self._pty_events, 0, None)
+        self._release_shell()
+        self.draining_until = time.monotonic() + self.server.drain_timeout
+        self.server.draining.append(self)
+        self._send()
+        if not self.closed:
+            self.update_events()
+
+    def update_events(self):
+        """Register interest matching the buffers, pausing the side whose peer cannot keep up."""
+        if self.draining_until is not None:
+            # Only the remaining output is of interest, client input has nowhere to go
+            if not self.output:
+                self.close()
+            else:
+                self._socket_events = self._set_events(self.client_socket, self._socket_events,
+                                                       selectors.EVENT_WRITE, self.on_client_event)
+            return
+        limit = self.server.output_buffer_size
+        socket_events = _events_of(len(self.input) < limit, bool(self.output))
+        pty_events = _events_of(len(self.output) < limit, bool(self.input))
+        self._socket_events = self._set_events(self.client_socket, self._socket_events, socket_events,
+                                               self.on_client_event)
+        self._pty_events = self._set_events(self.master_fd, self._pty_events, pty_events, self.on_pty_event)
+
+    def _set_events(self, fileobj, old: int, new: int, callback) -> int:
+        selector = self.server.selector
+        if old == new:
+            pass
+        elif not old:
+            selector.register(fileobj, new, callback)
+        elif not new:
+            selector.unregister(fileobj)
+        else:
+            selector.modify(fileobj, new, callback)
+        return new
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.server.remove_session(self)
+        if self._socket_events:
+            self.server.selector.unregister(self.client_socket)
+        if self._pty_events:
+            self.server.selector.unregister(self.master_fd)
+        self._socket_events = self._pty_events = 0
+        self.client_socket.close()
+        self._release_shell()
+
+    def _release_shell(self):
+        if self._shell_released:
+            return
+        self._shell_released = True
+        # Hang up the shell's whole session, it is reaped by the server loop
+        self.shell.hangup()
+        self.master_fd = -1
+        self.server.reap(self.shell.process)
 
 
 class TelnetServer:
-    def __init__(self, host, port):
+    def __init__(self, host, port, max_sessions=1000, output_buffer_size=256 * 1024, shell_pool_size=4,
+                 shell_max_idle=600.0, compression=True, compress_level=6, compress_flush=zlib.Z_SYNC_FLUSH,
+                 stats_interval=None, stats_port=None, drain_timeout=10.0):
+        """Telnet server serving every session from one selector loop.
+
+        Args:
+            host (str): The address to listen on.
+            port (int): The port to listen on.
+            max_sessions (int, optional): Maximum concurrent sessions, further clients are
+                told so and disconnected. Defaults to 1000.
+            output_buffer_size (int, optional): Bytes buffered per session and direction, reading
+                from the shell (or the client) pauses while its buffer is full. Defaults to 256 KiB.
+            shell_pool_size (int, optional): Shells kept started ahead of connections, 0 spawns each
+                shell on connect. Defaults to 4.
+            shell_max_idle (float, optional): Seconds after which an unused pooled shell is replaced,
+                None keeps it. Defaults to 600.
+            compression (bool, optional): Offer MCCP2 (telnet option 86) zlib compression of the
+                output to clients that support it. Defaults to True.
+            compress_level (int, optional): zlib compression level. Defaults to 6.
+            compress_flush (int, optional): zlib flush mode used whenever the client has received
+                all earlier output, zlib.Z_SYNC_FLUSH or zlib.Z_PARTIAL_FLUSH keep the stream
+                going, zlib.Z_FULL_FLUSH also resets the dictionary. Defaults to zlib.Z_SYNC_FLUSH.
+            stats_interval (float, optional): Seconds between aggregate statistics logged at INFO level,
+                None disables them. Defaults to None.
+            stats_port (int, optional): Port on the same host that answers every connection with the
+                output of `stats` as one line of JSON, None disables it. Defaults to None.
+            drain_timeout (float, optional): Seconds a client gets to receive the output left when its
+                shell exits before the connection is closed anyway. Defaults to 10.
+        """
         self.host = host
         self.port = port
+        self.max_sessions = max_sessions
+        self.output_buffer_size = output_buffer_size
+        self.compression = compression
+        self.compress_level = compress_level
+        self.compress_flush = compress_flush
+        self.drain_timeout = drain_timeout
+        # Sessions whose shell exited and that are sending their remaining output
+        self.draining: List[_Session] = []
+        self.stats_interval = stats_interval
+        self.stats_port = stats_port
+        self.stats_socket = None
+        # Totals of closed sessions, see stats()
+        self.total_sessions = 0
+        self.rejected_sessions = 0
+        self._closed_totals = {"bytes_in": 0, "bytes_out": 0, "shell_bytes_out": 0, "queue_time": 0.0}
+        self._queue_time_max = 0.0
         self.server_socket = None
-        self.executor = ThreadPoolExecutor(max_workers=10)
+        self.selector = selectors.DefaultSelector()
+        self.sessions: Dict[int, _Session] = {}
+        # Shells that were hung up but have not exited yet, with the time to kill them, None once killed
+        self._dying: List[Tuple[subprocess.Popen, Optional[float]]] = []
+        self._running = False
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
 
         self.logger = SimpleLogger(__name__).logger
+        self.shell_pool = _ShellPool(shell_pool_size, shell_max_idle,
+                                     lambda: self.max_sessions - len(self.sessions), self.logger)
 
     def start(self):
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.server_socket.bind((self.host, self.port))
-        self.server_socket.listen(5)
+        self.server_socket.listen(128)
+        self.server_socket.setblocking(False)
+        self.selector.register(self.server_socket, selectors.EVENT_READ, self.accept)
+        self._wakeup_r.setblocking(False)
+        self.selector.register(self._wakeup_r, selectors.EVENT_READ, self._on_wakeup)
+        if self.stats_port is not None:
+            self.stats_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.stats_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.stats_socket.bind((self.host, self.stats_port))
+            self.stats_socket.listen(16)
+            self.stats_socket.setblocking(False)
+            self.selector.register(self.stats_socket, selectors.EVENT_READ, self._accept_stats)
         self.logger.info(f"Telnet server started on {self.host}:{self.port}")
 
+        self._running = True
+        if self.shell_pool.size > 0:
+            self.shell_pool.start()
+        next_stats = time.monotonic() + self.stats_interval if self.stats_interval else None
         try:
-            while True:
-                client_socket, client_address = self.server_socket.accept()
-                self.executor.submit(self.handle_client, client_socket)
+            while self._running:
+                timeout = self._reap_timeout()
+                if self.draining:
+                    next_drained = min(session.draining_until for session in self.draining)
+                    until_drained = max(0.0, next_drained - time.monotonic())
+                    timeout = until_drained if timeout is None else min(timeout, until_drained)
+                if next_stats is not None:
+                    until_stats = max(0.0, next_stats - time.monotonic())
+                    timeout = until_stats if timeout is None else min(timeout, until_stats)
+                for key, mask in self.selector.select(timeout=timeout):
+                    key.data(mask)
+                self._reap_dying()
+                self._expire_draining()
+                if next_stats is not None and time.monotonic() >= next_stats:
+                    self.log_stats()
+                    next_stats += self.stats_interval
         except KeyboardInterrupt:
-            self.stop()
+            pass
+        finally:
+            self._running = False
+            self._shutdown()
+
+    def accept(self, mask: int):
+        while True:
+            try:
+                client_socket, client_address = self.server_socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                # Out of file descriptors and similar, retry on the next event
+                self.logger.error(f"Error accepting client: {e}")
+                return
+            accepted_at = time.monotonic()
+            if len(self.sessions) >= self.max_sessions:
+                self.rejected_sessions += 1
+                self.logger.warning(f"Rejected client {client_address}: {self.max_sessions} sessions active")
+                try:
+                    client_socket.send(b"Too many sessions, try again later.\r\n")
+                except OSError:
+                    pass
+                client_socket.close()
+                continue
+            shell = None
+            try:
+                shell = self.shell_pool.take() or _Shell()
+                session = _Session(self, client_socket, client_address, shell, accepted_at)
+            except Exception as e:
+                self.logger.error(f"Error starting session for {client_address}: {e}")
+                client_socket.close()
+                if shell is not None:
+                    shell.hangup()
+                    self.reap(shell.process)
+                continue
+            if session.closed:
+                # The client went away while the session was set up, close() already released it
+                self.logger.info(f"Client {client_address} disconnected during session setup")
+                continue
+            self.sessions[client_socket.fileno()] = session
+            self.total_sessions += 1
+            self._queue_time_max = max(self._queue_time_max, session.queue_time)
+            self.logger.info(f"Connected client: {client_address}")
+
+    def remove_session(self, session: _Session):
+        if self.sessions.pop(session.client_socket.fileno(), None) is not None:
+            for name in self._closed_totals:
+                self._closed_totals[name] += getattr(session, name)
+            self.logger.info(f"Disconnected client: {session.client_address}, in {session.bytes_in} B, "
+                             f"out {session.bytes_out} B, {time.monotonic() - session.accepted_at:.1f}s")
+
+    def stats(self) -> dict:
+        """Aggregate and per-session counters, times are in seconds.
+
+        Returns:
+            dict: Session counts, byte totals including closed sessions, the average and maximum
+                accept-to-shell latency (queue_time_*, from accept until a session had its shell,
+                not counting the wait in the listen backlog before accept), and one entry per
+                active session.
+        """
+        sessions = [session.stats() for session in list(self.sessions.values())]
+        totals = dict(self._closed_totals)
+        for session in sessions:
+            for name in totals:
+                totals[name] += session[name]
+        return {
+            "active_sessions": len(sessions),
+            "total_sessions": self.total_sessions,
+            "rejected_sessions": self.rejected_sessions,
+            "idle_shells": len(self.shell_pool),
+            "bytes_in": totals["bytes_in"],
+            "bytes_out": totals["bytes_out"],
+            "shell_bytes_out": totals["shell_bytes_out"],
+            "queue_time_avg": totals["queue_time"] / self.total_sessions if self.total_sessions else 0.0,
+            "queue_time_max": self._queue_time_max,
+            "sessions": sessions,
+        }
 
-    def handle_client(self, client_socket):
-        self.logger.info(f"Connected client: {client_socket.getpeername()}")
-        master_fd, slave_fd, shell_pid = None, None, None
+    def log_stats(self):
+        stats = self.stats()
+        self.logger.info(f"Stats: {stats['active_sessions']} active, {stats['total_sessions']} total, "
+                         f"{stats['rejected_sessions']} rejected sessions, {stats['idle_shells']} idle shells, "
+                         f"in {stats['bytes_in']} B, out {stats['bytes_out']} B "
+                         f"(shell {stats['shell_bytes_out']} B), accept-to-shell avg "
+                         f"{stats['queue_time_avg'] * 1000:.1f} ms, max {stats['queue_time_max'] * 1000:.1f} ms")
 
+    def _accept_stats(self, mask: int):
         try:
-            master_fd, slave_fd = pty.openpty()
-            shell_pid = subprocess.Popen(['/bin/bash'], stdin=slave_fd, stdout=slave_fd, stderr=slave_fd)
+            client_socket, _ = self.stats_socket.accept()
+        except OSError:
+            return
+        client_socket.setblocking(False)
+        pending = bytearray(json.dumps(self.stats()).encode() + b"\n")
 
-            os.close(slave_fd)
+        def on_writable(mask: int):
+            try:
+                del pending[:client_socket.send(pending)]
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                pending.clear()
+            if not pending:
+                self.selector.unregister(client_socket)
+                client_socket.close()
 
-            inputs = [client_socket, master_fd]
-
-            while True:
-                readable, _, _ = select.select(inputs, [], [])
-                for fd in readable:
-                    if fd == client_socket:
-                        data = client_socket.recv(1024)
-                        if not data:
-                            # Client closed the connection
-                            self.close_connection(client_socket, master_fd, shell_pid.pid)
-                            return
-                        os.write(master_fd, data)
-                    elif fd == master_fd:
-                        output = os.read(master_fd, 1024)
-                        client_socket.sendall(output)
-        except Exception as e:
-            self.logger.error(f"Error handling client: {e}")
-        finally:
-            self.close_connection(client_socket, master_fd, shell_pid.pid)
+        self.selector.register(client_socket, selectors.EVENT_WRITE, on_writable)
+
+    def reap(self, shell: subprocess.Popen):
+        """Wait for a hung up shell from the server loop, killing it if it is still running after a grace period."""
+        if shell.poll() is None:
+            self._dying.append((shell, time.monotonic() + _HANGUP_GRACE))
+
+    def _reap_timeout(self) -> Optional[float]:
+        if not self._dying:
+            return None
+        deadlines = [deadline for _, deadline in self._dying if deadline is not None]
+        if not deadlines:
+            return 1.0
+        return max(0.0, min(1.0, min(deadlines) - time.monotonic()))
+
+    def _reap_dying(self):
+        now = time.monotonic()
+        still_running = []
+        for shell, deadline in self._dying:
+            if shell.poll() is not None:
+                continue
+            if deadline is not None and now >= deadline:
+                # The shell ignored SIGHUP
+                try:
+                    os.killpg(shell.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                deadline = None
+            still_running.append((shell, deadline))
+        self._dying = still_running
 
-    @classmethod
-    def close_connection(cls, client_socket, master_fd, shell_pid):
-        client_socket.close()
-        os.close(master_fd)
-        os.kill(shell_pid, 9)
+    def _expire_draining(self):
+        now = time.monotonic()
+        still_draining = []
+        for session in self.draining:
+            if session.closed:
+                continue
+            if now >= session.draining_until:
+                self.logger.warning(f"Dropped {len(session.output)} B of output to {session.client_address}: "
+                                    f"not received within {self.drain_timeout}s")
+                session.close()
+                continue
+            still_draining.append(session)
+        self.draining = still_draining
+
+    def _on_wakeup(self, mask: int):
+        try:
+            self._wakeup_r.recv(4096)
+        except BlockingIOError:
+            pass
 
     def stop(self):
+        """Stop the server loop, safe to call from another thread or a signal handler."""
+        self._running = False
+        try:
+            self._wakeup_w.send(b"\0")
+        except OSError as e:
+            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+
+    def _shutdown(self):
         self.logger.info("Stopping Telnet server...")
+        self.shell_pool.close()
+        for session in list(self.sessions.values()):
+            session.close()
+        self.selector.unregister(self.server_socket)
         self.server_socket.close()
-        self.executor.shutdown()
+        if self.stats_socket is not None:
+            self.selector.unregister(self.stats_socket)
+            self.stats_socket.close()
+        for shell, deadline in self._dying:
+            try:
+                shell.wait(timeout=max(0.0, deadline - time.monotonic()) if deadline is not None else 0)
+            except subprocess.TimeoutExpired:
+                try:
+                    os.killpg(shell.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                shell.wait()
+        self._dying = []
         self.logger.info("Telnet server stopped.")
 
 